@@ -0,0 +1,38 @@
+-- 为后台管理列表查询添加复合索引
+-- 让组织/权限/角色/用户列表按排序列直接走索引扫描，避免每次查询都做顺序扫描加排序
+
+-- 1. 组织：get_children / get_children_many 按 parent_id、is_active 过滤并按 sort_order, name 排序
+CREATE INDEX CONCURRENTLY IF NOT EXISTS organizations_sort_idx
+ON organizations (parent_id, is_active, sort_order, name);
+
+-- 2. 权限：list_permissions 按 resource 过滤并按 resource, code 排序
+CREATE INDEX CONCURRENTLY IF NOT EXISTS permissions_list_idx
+ON permissions (resource, code);
+
+-- 3. 角色：list_roles 按 is_system、is_active、organization_id 过滤，
+--    按 sort_order, name, id 排序并支持 (sort_order, name, id) > (...) 的键集分页；
+--    sort_order 与 name 都不唯一，id 作为最后的排序键避免翻页时跳过并列行
+CREATE INDEX CONCURRENTLY IF NOT EXISTS roles_listing_idx
+ON roles (is_system, is_active, organization_id, sort_order, name, id);
+
+-- 4. 用户：list_users 按 created_at DESC, id DESC 排序并支持 (created_at, id) < (...) 的键集分页
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_created_idx
+ON users (created_at DESC, id DESC);
+
+-- 5. 用户：list_users 按 organization_id 或 department_id 过滤时，同样按 created_at DESC, id DESC 排序；
+--    查询返回 u.* 并关联组织/部门名称，无法做纯索引扫描，因此不加 INCLUDE 列
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_org_created_idx
+ON users (organization_id, created_at DESC, id DESC);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS users_dept_created_idx
+ON users (department_id, created_at DESC, id DESC);
+
+-- 6. 验证索引是否创建成功
+SELECT
+    tablename,
+    indexname,
+    indexdef
+FROM pg_indexes
+WHERE indexname IN ('organizations_sort_idx', 'permissions_list_idx', 'roles_listing_idx', 'users_created_idx',
+                    'users_org_created_idx', 'users_dept_created_idx')
+ORDER BY indexname;
@@ -6,6 +6,7 @@
 初始化工作流菜单配置
 """
 
+import asyncio
 import sys
 import os
 
@@ -19,23 +20,24 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
-def init_workflow_menus():
+async def init_workflow_menus():
     """初始化工作流菜单"""
     
+    from src.server.auth.admin._db import close_pool
     from src.server.auth.admin.menus import get_db_connection
     
-    # 检查菜单是否已存在
-    conn = get_db_connection()
     try:
-        with conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM menus WHERE code = 'workflow'")
-            existing = cursor.fetchone()
-            if existing:
-                logger.info("工作流菜单已存在，跳过创建")
-                return
+        # 检查菜单是否已存在
+        async with get_db_connection() as conn:
+            async with conn.cursor() as cursor:
+                await cursor.execute("SELECT id FROM menus WHERE code = 'workflow'")
+                existing = await cursor.fetchone()
+        if existing:
+            logger.info("工作流菜单已存在，跳过创建")
+            return
         
         # 创建工作流主菜单
-        workflow_menu_id = MenuAdminDB.create_menu(
+        workflow_menu = await MenuAdminDB.create_menu(
             code="workflow",
             name="工作流管理",
             path="/admin/workflows",
@@ -46,14 +48,15 @@ def init_workflow_menus():
             parent_id=None,
         )
         
-        if not workflow_menu_id:
+        if not workflow_menu:
             logger.error("创建工作流主菜单失败")
             return
         
+        workflow_menu_id = workflow_menu["id"]
         logger.info(f"创建工作流主菜单成功，ID: {workflow_menu_id}")
         
         # 创建工作流列表子菜单
-        workflow_list_id = MenuAdminDB.create_menu(
+        workflow_list = await MenuAdminDB.create_menu(
             code="workflow:list",
             name="工作流列表",
             path="/admin/workflows",
@@ -64,8 +67,8 @@ def init_workflow_menus():
             parent_id=workflow_menu_id,
         )
         
-        if workflow_list_id:
-            logger.info(f"创建工作流列表菜单成功，ID: {workflow_list_id}")
+        if workflow_list:
+            logger.info(f"创建工作流列表菜单成功，ID: {workflow_list['id']}")
         
         # 创建工作流编辑器子菜单（动态路由，不直接显示在菜单中）
         # 这个菜单项主要用于权限控制，实际访问通过工作流列表跳转
@@ -75,9 +78,10 @@ def init_workflow_menus():
     except Exception as e:
         logger.error(f"初始化工作流菜单失败: {e}", exc_info=True)
     finally:
-        conn.close()
+        # 关闭共享连接池，避免事件循环退出时仍有连接池后台任务
+        await close_pool()
 
 
 if __name__ == "__main__":
-    init_workflow_menus()
+    asyncio.run(init_workflow_menus())
 
@@ -185,6 +185,7 @@ app.add_middleware(
     # 允许所有 HTTP 方法，确保 PUT/PATCH 等更新接口的跨域预检不会返回 400
     allow_methods=["*"],
     allow_headers=["*"],  # Now allow all headers, but can be restricted further
+    expose_headers=["X-Total-Count", "X-Next-Cursor"],  # Pagination metadata for admin list endpoints
 )
 
 # Load examples into Milvus if configured
@@ -279,10 +280,20 @@ async def setup_checkpoint_tables():
     except Exception as e:
         logger.warning(f"Failed to start workflow worker: {e}")
 
+    # Open the shared admin/auth database pool up front instead of on the first request
+    try:
+        from src.server.auth.admin._db import get_pool
+        await get_pool()
+    except Exception as e:
+        logger.warning(f"Failed to open database pool: {e}")
+
+    from src.server.auth.db import start_login_flusher
+    start_login_flusher()
+
 
 @app.on_event("shutdown")
 async def shutdown_worker():
-    """Stop workflow worker on application shutdown."""
+    """Stop workflow worker and close the database pool on application shutdown."""
     try:
         from src.server.workflow.worker import get_workflow_worker
         worker = get_workflow_worker()
@@ -291,6 +302,19 @@ async def shutdown_worker():
     except Exception as e:
         logger.warning(f"Failed to stop workflow worker: {e}")
 
+    # Flush buffered logins while the pool is still open
+    try:
+        from src.server.auth.db import stop_login_flusher
+        await stop_login_flusher()
+    except Exception as e:
+        logger.warning(f"Failed to flush last login times: {e}")
+
+    try:
+        from src.server.auth.admin._db import close_pool
+        await close_pool()
+    except Exception as e:
+        logger.warning(f"Failed to close database pool: {e}")
+
 
 @app.post("/api/chat/stream")
 async def chat_stream(
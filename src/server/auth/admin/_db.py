@@ -0,0 +1,117 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""
+Shared database connection pool for the admin modules and the auth layer.
+"""
+
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncIterator, List, Optional, Sequence
+from uuid import UUID
+
+from psycopg import AsyncConnection
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from src.config.loader import get_int_env, get_str_env
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[AsyncConnectionPool] = None
+_pool_lock = asyncio.Lock()
+
+
+@lru_cache(maxsize=4096)
+def _uuid_from_str(value: str) -> UUID:
+    return UUID(value)
+
+
+def as_uuid(value) -> Optional[UUID]:
+    """Safely convert possible UUID/str/None to UUID or None."""
+    # psycopg returns uuid columns as UUID already, so that case is checked first
+    if value.__class__ is UUID:
+        return value
+    if value is None:
+        return None
+    return _uuid_from_str(str(value))
+
+
+@lru_cache(maxsize=1)
+def get_db_url() -> str:
+    """Resolve the database URL from the environment (once per process)."""
+    # libpq accepts both postgres:// and postgresql:// URIs, so no rewrite is needed
+    return (
+        get_str_env("DATABASE_URL") or
+        get_str_env("SQLALCHEMY_DATABASE_URI") or
+        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
+    )
+
+
+async def get_pool() -> AsyncConnectionPool:
+    """Get the process-wide connection pool, opening it on first use.
+
+    Shared by the admin modules and the auth layer (``auth/db.py``).
+    """
+    global _pool
+    if _pool is None:
+        async with _pool_lock:
+            if _pool is None:
+                # Autocommit: single statements need no BEGIN/COMMIT pair;
+                # multi-statement writes wrap themselves in conn.transaction()
+                pool = AsyncConnectionPool(
+                    get_db_url(),
+                    min_size=get_int_env("DB_POOL_MIN", 5),
+                    max_size=get_int_env("DB_POOL_MAX", (os.cpu_count() or 1) * 2 + 2),
+                    kwargs={"row_factory": dict_row, "autocommit": True},
+                    open=False,
+                )
+                await pool.open()
+                _pool = pool
+                logger.info("Database connection pool opened")
+    return _pool
+
+
+async def close_pool() -> None:
+    """Close the connection pool if it was opened."""
+    global _pool
+    async with _pool_lock:
+        if _pool is not None:
+            await _pool.close()
+            _pool = None
+            logger.info("Database connection pool closed")
+
+
+@asynccontextmanager
+async def get_db_connection() -> AsyncIterator[AsyncConnection]:
+    """Borrow a pooled database connection for the duration of an ``async with`` block."""
+    pool = await get_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+async def fetch_one(
+    query: str,
+    params: Optional[Sequence[Any]] = None,
+    *,
+    prepare: Optional[bool] = None,
+) -> Optional[dict]:
+    """Run a read-only query on a pooled connection and return its first row."""
+    async with get_db_connection() as conn:
+        cursor = await conn.execute(query, params, prepare=prepare)
+        return await cursor.fetchone()
+
+
+async def fetch_all(
+    query: str,
+    params: Optional[Sequence[Any]] = None,
+    *,
+    prepare: Optional[bool] = None,
+) -> List[dict]:
+    """Run a read-only query on a pooled connection and return all rows."""
+    async with get_db_connection() as conn:
+        cursor = await conn.execute(query, params, prepare=prepare)
+        return await cursor.fetchall()
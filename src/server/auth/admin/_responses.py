@@ -0,0 +1,25 @@
+# Copyright (c) 2025 Bytedance Ltd. and/or its affiliates
+# SPDX-License-Identifier: MIT
+
+"""
+JSON response class for admin endpoints.
+"""
+
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# orjson options for every admin JSON body, including streamed ones
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_UUID
+
+
+class ORJSONResponse(JSONResponse):
+    """JSON response rendered by orjson.
+
+    UUIDs and datetimes are serialized natively by orjson, so tree nodes can
+    carry raw DB values instead of pre-converted strings.
+    """
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, option=ORJSON_OPTIONS)
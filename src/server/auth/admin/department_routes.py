@@ -20,43 +20,36 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/admin/departments", tags=["admin", "departments"])
 
 
+def _department_response(dept: dict, children: Optional[list] = None) -> DepartmentResponse:
+    """Build a DepartmentResponse from a department row.
+
+    psycopg returns uuid columns as UUID already, so only the timestamps need
+    converting.
+    """
+    created_at = dept.get("created_at")
+    updated_at = dept.get("updated_at")
+    return DepartmentResponse(
+        id=dept["id"],
+        code=dept["code"],
+        name=dept["name"],
+        organization_id=dept["organization_id"],
+        description=dept.get("description"),
+        parent_id=dept.get("parent_id"),
+        manager_id=dept.get("manager_id"),
+        is_active=dept.get("is_active", True),
+        sort_order=dept.get("sort_order", 0),
+        created_at=created_at.isoformat() if created_at else None,
+        updated_at=updated_at.isoformat() if updated_at else None,
+        children=children or [],
+    )
+
+
 def build_dept_tree(depts: list, parent_id: Optional[UUID] = None) -> list:
     """Build department tree structure."""
     result = []
     for dept in depts:
-        raw_parent = dept.get("parent_id")
-        dept_parent_id = (
-            raw_parent
-            if isinstance(raw_parent, UUID)
-            else (UUID(str(raw_parent)) if raw_parent else None)
-        )
-        if dept_parent_id == parent_id:
-            dept_dict = DepartmentResponse(
-                id=dept["id"] if isinstance(dept["id"], UUID) else UUID(str(dept["id"])),
-                code=dept["code"],
-                name=dept["name"],
-                organization_id=(
-                    dept["organization_id"]
-                    if isinstance(dept["organization_id"], UUID)
-                    else UUID(str(dept["organization_id"]))
-                ),
-                description=dept.get("description"),
-                parent_id=dept_parent_id,
-                manager_id=(
-                    dept["manager_id"]
-                    if isinstance(dept.get("manager_id"), UUID)
-                    else (UUID(str(dept["manager_id"])) if dept.get("manager_id") else None)
-                ),
-                is_active=dept.get("is_active", True),
-                sort_order=dept.get("sort_order", 0),
-                created_at=dept.get("created_at").isoformat() if dept.get("created_at") else None,
-                updated_at=dept.get("updated_at").isoformat() if dept.get("updated_at") else None,
-                children=build_dept_tree(
-                    depts,
-                    dept["id"] if isinstance(dept["id"], UUID) else UUID(str(dept["id"])),
-                ),
-            )
-            result.append(dept_dict)
+        if dept.get("parent_id") == parent_id:
+            result.append(_department_response(dept, build_dept_tree(depts, dept["id"])))
     return sorted(result, key=lambda x: x.sort_order)
 
 
@@ -67,7 +60,7 @@ async def list_departments(
     current_user: CurrentUser = Depends(require_permission("department:read")),
 ):
     """List departments by organization as a tree structure."""
-    depts = DepartmentDB.list_by_organization(organization_id, include_inactive=include_inactive)
+    depts = await DepartmentDB.list_by_organization(organization_id, include_inactive=include_inactive)
     depts_tree = build_dept_tree(depts)
     return depts_tree
 
@@ -78,7 +71,7 @@ async def get_department(
     current_user: CurrentUser = Depends(require_permission("department:read")),
 ):
     """Get department by ID."""
-    dept_data = DepartmentDB.get_by_id(dept_id)
+    dept_data = await DepartmentDB.get_by_id(dept_id)
     if not dept_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -86,8 +79,8 @@ async def get_department(
         )
     
     # Get all depts for the organization to build tree
-    org_id = UUID(dept_data["organization_id"])
-    all_depts = DepartmentDB.list_by_organization(org_id, include_inactive=True)
+    org_id = dept_data["organization_id"]
+    all_depts = await DepartmentDB.list_by_organization(org_id, include_inactive=True)
     depts_tree = build_dept_tree(all_depts)
     
     # Find the dept in tree
@@ -104,20 +97,7 @@ async def get_department(
     dept = find_dept(depts_tree, dept_id)
     if not dept:
         # Return flat dept if not found in tree
-        return DepartmentResponse(
-            id=UUID(dept_data["id"]),
-            code=dept_data["code"],
-            name=dept_data["name"],
-            organization_id=UUID(dept_data["organization_id"]),
-            description=dept_data.get("description"),
-            parent_id=UUID(dept_data["parent_id"]) if dept_data.get("parent_id") else None,
-            manager_id=UUID(dept_data["manager_id"]) if dept_data.get("manager_id") else None,
-            is_active=dept_data.get("is_active", True),
-            sort_order=dept_data.get("sort_order", 0),
-            created_at=dept_data.get("created_at").isoformat() if dept_data.get("created_at") else None,
-            updated_at=dept_data.get("updated_at").isoformat() if dept_data.get("updated_at") else None,
-            children=[],
-        )
+        return _department_response(dept_data)
     
     return dept
 
@@ -129,14 +109,14 @@ async def create_department(
 ):
     """Create a new department."""
     # Check if code already exists in organization
-    existing = DepartmentDB.get_by_code(dept_data.code, dept_data.organization_id)
+    existing = await DepartmentDB.get_by_code(dept_data.code, dept_data.organization_id)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Department code already exists in this organization",
         )
     
-    dept_id = DepartmentDB.create(
+    dept_id = await DepartmentDB.create(
         code=dept_data.code,
         name=dept_data.name,
         organization_id=dept_data.organization_id,
@@ -151,33 +131,8 @@ async def create_department(
             detail="Failed to create department",
         )
     
-    created = DepartmentDB.get_by_id(dept_id)
-    return DepartmentResponse(
-        id=created["id"] if isinstance(created["id"], UUID) else UUID(str(created["id"])),
-        code=created["code"],
-        name=created["name"],
-        organization_id=(
-            created["organization_id"]
-            if isinstance(created.get("organization_id"), UUID)
-            else UUID(str(created["organization_id"]))
-        ),
-        description=created.get("description"),
-        parent_id=(
-            created["parent_id"]
-            if isinstance(created.get("parent_id"), UUID)
-            else (UUID(str(created["parent_id"])) if created.get("parent_id") else None)
-        ),
-        manager_id=(
-            created["manager_id"]
-            if isinstance(created.get("manager_id"), UUID)
-            else (UUID(str(created["manager_id"])) if created.get("manager_id") else None)
-        ),
-        is_active=created.get("is_active", True),
-        sort_order=created.get("sort_order", 0),
-        created_at=created.get("created_at").isoformat() if created.get("created_at") else None,
-        updated_at=created.get("updated_at").isoformat() if created.get("updated_at") else None,
-        children=[],
-    )
+    created = await DepartmentDB.get_by_id(dept_id)
+    return _department_response(created)
 
 
 @router.put("/{dept_id}", response_model=DepartmentResponse)
@@ -187,14 +142,14 @@ async def update_department(
     current_user: CurrentUser = Depends(require_permission("department:update")),
 ):
     """Update department information."""
-    existing = DepartmentDB.get_by_id(dept_id)
+    existing = await DepartmentDB.get_by_id(dept_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Department not found",
         )
     
-    success = DepartmentDB.update(
+    success = await DepartmentDB.update(
         dept_id=dept_id,
         code=dept_data.code,
         name=dept_data.name,
@@ -210,33 +165,8 @@ async def update_department(
             detail="Failed to update department",
         )
     
-    updated = DepartmentDB.get_by_id(dept_id)
-    return DepartmentResponse(
-        id=updated["id"] if isinstance(updated["id"], UUID) else UUID(str(updated["id"])),
-        code=updated["code"],
-        name=updated["name"],
-        organization_id=(
-            updated["organization_id"]
-            if isinstance(updated["organization_id"], UUID)
-            else UUID(str(updated["organization_id"]))
-        ),
-        description=updated.get("description"),
-        parent_id=(
-            updated["parent_id"]
-            if isinstance(updated.get("parent_id"), UUID)
-            else (UUID(str(updated["parent_id"])) if updated.get("parent_id") else None)
-        ),
-        manager_id=(
-            updated["manager_id"]
-            if isinstance(updated.get("manager_id"), UUID)
-            else (UUID(str(updated["manager_id"])) if updated.get("manager_id") else None)
-        ),
-        is_active=updated.get("is_active", True),
-        sort_order=updated.get("sort_order", 0),
-        created_at=updated.get("created_at").isoformat() if updated.get("created_at") else None,
-        updated_at=updated.get("updated_at").isoformat() if updated.get("updated_at") else None,
-        children=[],
-    )
+    updated = await DepartmentDB.get_by_id(dept_id)
+    return _department_response(updated)
 
 
 @router.delete("/{dept_id}")
@@ -245,14 +175,14 @@ async def delete_department(
     current_user: CurrentUser = Depends(require_permission("department:delete")),
 ):
     """Delete a department."""
-    existing = DepartmentDB.get_by_id(dept_id)
+    existing = await DepartmentDB.get_by_id(dept_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Department not found",
         )
     
-    success = DepartmentDB.delete(dept_id)
+    success = await DepartmentDB.delete(dept_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -6,137 +6,125 @@ Department database operations.
 """
 
 import logging
-from typing import List, Optional
+from functools import lru_cache
+from typing import List, Optional, Tuple
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from psycopg import sql
 
-from src.config.loader import get_str_env
+from ._db import as_uuid, get_db_connection
 
 logger = logging.getLogger(__name__)
 
 
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
-
-
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
+@lru_cache(maxsize=64)
+def _update_sql(columns: Tuple[str, ...]) -> sql.Composed:
+    """Build the department UPDATE statement for one set of columns (cached per set)."""
+    assignments = [sql.SQL("{} = %s").format(sql.Identifier(column)) for column in columns]
+    assignments.append(sql.SQL("updated_at = NOW()"))
+    return sql.SQL("UPDATE departments SET {} WHERE id = %s").format(
+        sql.SQL(", ").join(assignments)
     )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
 
 
 class DepartmentDB:
     """Department database operations."""
     
     @staticmethod
-    def get_by_id(dept_id: UUID) -> Optional[dict]:
+    async def get_by_id(dept_id: UUID) -> Optional[dict]:
         """Get department by ID."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT * FROM departments
                         WHERE id = %s
                         """,
-                        (str(dept_id),)
+                        (dept_id,)
                     )
-                    return cursor.fetchone()
+                    return await cursor.fetchone()
         except Exception as e:
             logger.error(f"Error getting department by ID: {e}")
             return None
     
     @staticmethod
-    def get_by_code(code: str, organization_id: Optional[UUID] = None) -> Optional[dict]:
+    async def get_by_code(code: str, organization_id: Optional[UUID] = None) -> Optional[dict]:
         """Get department by code."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
                     if organization_id:
-                        cursor.execute(
+                        await cursor.execute(
                             """
                             SELECT * FROM departments
                             WHERE code = %s AND organization_id = %s
                             """,
-                            (code, str(organization_id))
+                            (code, organization_id)
                         )
                     else:
-                        cursor.execute(
+                        await cursor.execute(
                             """
                             SELECT * FROM departments
                             WHERE code = %s
                             """,
                             (code,)
                         )
-                    return cursor.fetchone()
+                    return await cursor.fetchone()
         except Exception as e:
             logger.error(f"Error getting department by code: {e}")
             return None
     
     @staticmethod
-    def list_by_organization(organization_id: UUID, include_inactive: bool = False) -> List[dict]:
+    async def list_by_organization(organization_id: UUID, include_inactive: bool = False) -> List[dict]:
         """List departments by organization."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
                     if include_inactive:
-                        cursor.execute(
+                        await cursor.execute(
                             """
                             SELECT * FROM departments
                             WHERE organization_id = %s
                             ORDER BY sort_order, name
                             """,
-                        (str(organization_id),)
+                        (organization_id,)
                         )
                     else:
-                        cursor.execute(
+                        await cursor.execute(
                             """
                             SELECT * FROM departments
                             WHERE organization_id = %s AND is_active = true
                             ORDER BY sort_order, name
                             """,
-                        (str(organization_id),)
+                        (organization_id,)
                         )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error listing departments by organization: {e}")
             return []
     
     @staticmethod
-    def get_children(parent_id: UUID) -> List[dict]:
+    async def get_children(parent_id: UUID) -> List[dict]:
         """Get child departments."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT * FROM departments
                         WHERE parent_id = %s AND is_active = true
                         ORDER BY sort_order, name
                         """,
-                        (str(parent_id),)
+                        (parent_id,)
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting child departments: {e}")
             return []
 
     @staticmethod
-    def create(
+    async def create(
         code: str,
         name: str,
         organization_id: UUID,
@@ -147,58 +135,47 @@ class DepartmentDB:
     ) -> Optional[UUID]:
         """Create a new department."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get next sort_order under same parent in same organization
-                    if parent_id:
-                        cursor.execute(
-                            """
-                            SELECT COALESCE(MAX(sort_order), 0) + 1 AS next_order
-                            FROM departments
-                            WHERE organization_id = %s AND parent_id = %s
-                            """,
-                            (str(organization_id), str(parent_id)),
-                        )
-                    else:
-                        cursor.execute(
-                            """
-                            SELECT COALESCE(MAX(sort_order), 0) + 1 AS next_order
-                            FROM departments
-                            WHERE organization_id = %s AND parent_id IS NULL
-                            """,
-                            (str(organization_id),),
-                        )
-                    next_order = cursor.fetchone()["next_order"]
-
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # Next sort_order under the same parent in the same organization
+                    # is computed in the INSERT, so creation is one round trip
+                    await cursor.execute(
                         """
                         INSERT INTO departments (
                             code, name, organization_id, description,
                             parent_id, manager_id, is_active, sort_order
                         )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        VALUES (
+                            %s, %s, %s, %s, %s, %s, %s,
+                            (
+                                SELECT COALESCE(MAX(sort_order), 0) + 1
+                                FROM departments
+                                WHERE organization_id = %s
+                                  AND parent_id IS NOT DISTINCT FROM %s
+                            )
+                        )
                         RETURNING id
                         """,
                         (
                             code,
                             name,
-                            str(organization_id),
+                            organization_id,
                             description,
-                            str(parent_id) if parent_id else None,
-                            str(manager_id) if manager_id else None,
+                            parent_id,
+                            manager_id,
                             is_active,
-                            next_order,
+                            organization_id,
+                            parent_id,
                         ),
                     )
-                    dept_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(dept_id)
+                    dept_id = (await cursor.fetchone())["id"]
+                    return as_uuid(dept_id)
         except Exception as e:
             logger.error(f"Error creating department: {e}")
             return None
 
     @staticmethod
-    def update(
+    async def update(
         dept_id: UUID,
         code: Optional[str] = None,
         name: Optional[str] = None,
@@ -210,68 +187,46 @@ class DepartmentDB:
     ) -> bool:
         """Update department information."""
         try:
-            updates = []
-            values: list = []
-
-            if code is not None:
-                updates.append("code = %s")
-                values.append(code)
-            if name is not None:
-                updates.append("name = %s")
-                values.append(name)
-            if organization_id is not None:
-                updates.append("organization_id = %s")
-                values.append(str(organization_id))
-            if description is not None:
-                updates.append("description = %s")
-                values.append(description)
-            if parent_id is not None:
-                updates.append("parent_id = %s")
-                values.append(str(parent_id) if parent_id else None)
-            if manager_id is not None:
-                updates.append("manager_id = %s")
-                values.append(str(manager_id) if manager_id else None)
-            if is_active is not None:
-                updates.append("is_active = %s")
-                values.append(is_active)
+            # Provided fields in a fixed column order, so each column set maps to one statement
+            fields = {
+                "code": code,
+                "name": name,
+                "organization_id": organization_id,
+                "description": description,
+                "parent_id": parent_id,
+                "manager_id": manager_id,
+                "is_active": is_active,
+            }
+            updates = {column: value for column, value in fields.items() if value is not None}
 
             if not updates:
                 return True
 
-            updates.append("updated_at = NOW()")
-            values.append(str(dept_id))
-
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        f"""
-                        UPDATE departments
-                        SET {', '.join(updates)}
-                        WHERE id = %s
-                        """,
-                        values,
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        _update_sql(tuple(updates)),
+                        (*updates.values(), dept_id),
                     )
-                    conn.commit()
                     return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error updating department: {e}")
             return False
 
     @staticmethod
-    def delete(dept_id: UUID) -> bool:
+    async def delete(dept_id: UUID) -> bool:
         """Delete a department.
 
         For simplicity, we perform a hard delete. In production you may want
         to check for children or related users first.
         """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         "DELETE FROM departments WHERE id = %s",
-                        (str(dept_id),),
+                        (dept_id,),
                     )
-                    conn.commit()
                     return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting department: {e}")
@@ -6,13 +6,15 @@ Menu management API routes.
 """
 
 import logging
-from typing import List, Optional
+from operator import itemgetter
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 from ..dependencies import CurrentUser, require_permission
 from ..models import MenuCreate, MenuResponse, MenuUpdate
+from ._responses import ORJSONResponse
 from .menus import MenuAdminDB
 
 logger = logging.getLogger(__name__)
@@ -20,102 +22,87 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/admin/menus", tags=["admin", "menus"])
 
 
+# Columns copied from a menu row into its response node, in response order
+_MENU_FIELDS = (
+    "id", "code", "name", "path", "icon", "component", "menu_type",
+    "permission_code", "is_visible", "parent_id", "is_system", "sort_order",
+    "created_at", "updated_at",
+)
+_menu_values = itemgetter(*_MENU_FIELDS)
+
+
+def _prepare_menu_row(menu: dict) -> dict:
+    """Convert a menu row into a response node once, coercing IDs to UUID.
+
+    Rows come from ``SELECT *``/``RETURNING *`` so every column is present;
+    timestamps stay datetimes for ORJSONResponse to serialize natively.
+    """
+    node = dict(zip(_MENU_FIELDS, _menu_values(menu)))
+    if not isinstance(node["id"], UUID):
+        node["id"] = UUID(str(node["id"]))
+    raw_parent = node["parent_id"]
+    if raw_parent is not None and not isinstance(raw_parent, UUID):
+        node["parent_id"] = UUID(str(raw_parent))
+    node["children"] = []
+    return node
+
+
+def index_menu_tree(menus: list) -> Dict[UUID, dict]:
+    """Index prepared menu nodes by ID and link every node to its parent in a single pass.
+
+    Rows must already be ordered by ``sort_order, name`` (as the DB queries
+    return them); children are appended in that order, so no sorting is needed.
+    """
+    nodes: Dict[UUID, dict] = {}
+    for menu in menus:
+        node = _prepare_menu_row(menu)
+        nodes[node["id"]] = node
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"]) if node["parent_id"] else None
+        if parent is not None:
+            parent["children"].append(node)
+    return nodes
+
+
 def build_menu_tree(menus: list, parent_id: Optional[UUID] = None) -> list:
     """Build menu tree structure."""
-    result = []
-    for menu in menus:
-        raw_parent = menu.get("parent_id")
-        menu_parent_id = (
-            raw_parent
-            if isinstance(raw_parent, UUID)
-            else (UUID(str(raw_parent)) if raw_parent else None)
-        )
-        if menu_parent_id == parent_id:
-            menu_dict = MenuResponse(
-                id=menu["id"] if isinstance(menu["id"], UUID) else UUID(str(menu["id"])),
-                code=menu["code"],
-                name=menu["name"],
-                path=menu.get("path"),
-                icon=menu.get("icon"),
-                component=menu.get("component"),
-                menu_type=menu.get("menu_type", "menu"),
-                permission_code=menu.get("permission_code"),
-                is_visible=menu.get("is_visible", True),
-                parent_id=menu_parent_id,
-                is_system=menu.get("is_system", False),
-                sort_order=menu.get("sort_order", 0),
-                created_at=menu.get("created_at").isoformat() if menu.get("created_at") else None,
-                updated_at=menu.get("updated_at").isoformat() if menu.get("updated_at") else None,
-                children=build_menu_tree(
-                    menus,
-                    menu["id"] if isinstance(menu["id"], UUID) else UUID(str(menu["id"])),
-                ),
-            )
-            result.append(menu_dict)
-    return sorted(result, key=lambda x: x.sort_order)
+    nodes = index_menu_tree(menus)
+    return [node for node in nodes.values() if node["parent_id"] == parent_id]
 
 
-@router.get("", response_model=List[MenuResponse])
+@router.get("", responses={200: {"model": List[MenuResponse]}})
 async def list_menus(
     include_system: bool = Query(True),
     current_user: CurrentUser = Depends(require_permission("menu:read")),
 ):
     """List all menus as a tree structure."""
-    menus = MenuAdminDB.list_all(include_system=include_system)
+    menus = await MenuAdminDB.list_all(include_system=include_system)
     menus_tree = build_menu_tree(menus)
-    return menus_tree
+    return ORJSONResponse(content=menus_tree)
 
 
-@router.get("/{menu_id}", response_model=MenuResponse)
+@router.get("/{menu_id}", responses={200: {"model": MenuResponse}})
 async def get_menu(
     menu_id: UUID,
     current_user: CurrentUser = Depends(require_permission("menu:read")),
 ):
     """Get menu by ID."""
-    menu_data = MenuAdminDB.get_by_id(menu_id)
-    if not menu_data:
+    # The subtree query returns the requested menu and its descendants
+    subtree = await MenuAdminDB.get_subtree(menu_id)
+    if not subtree:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Menu not found",
         )
     
-    # Get all menus to build tree
-    all_menus = MenuAdminDB.list_all(include_system=True)
-    menus_tree = build_menu_tree(all_menus)
-    
-    # Find the menu in tree
-    def find_menu(menus_list: List[MenuResponse], target_id: UUID) -> Optional[MenuResponse]:
-        for menu in menus_list:
-            if menu.id == target_id:
-                return menu
-            if menu.children:
-                found = find_menu(menu.children, target_id)
-                if found:
-                    return found
-        return None
-    
-    menu = find_menu(menus_tree, menu_id)
+    menu = index_menu_tree(subtree).get(menu_id)
     if not menu:
-        # Return flat menu if not found in tree
-        return MenuResponse(
-            id=UUID(menu_data["id"]),
-            code=menu_data["code"],
-            name=menu_data["name"],
-            path=menu_data.get("path"),
-            icon=menu_data.get("icon"),
-            component=menu_data.get("component"),
-            menu_type=menu_data.get("menu_type", "menu"),
-            permission_code=menu_data.get("permission_code"),
-            is_visible=menu_data.get("is_visible", True),
-            parent_id=UUID(menu_data["parent_id"]) if menu_data.get("parent_id") else None,
-            is_system=menu_data.get("is_system", False),
-            sort_order=menu_data.get("sort_order", 0),
-            created_at=menu_data.get("created_at").isoformat() if menu_data.get("created_at") else None,
-            updated_at=menu_data.get("updated_at").isoformat() if menu_data.get("updated_at") else None,
-            children=[],
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Tree inconsistency",
         )
     
-    return menu
+    return ORJSONResponse(content=menu)
 
 
 @router.post("", response_model=MenuResponse, status_code=status.HTTP_201_CREATED)
@@ -124,7 +111,7 @@ async def create_menu(
     current_user: CurrentUser = Depends(require_permission("menu:create")),
 ):
     """Create a new menu."""
-    menu_id = MenuAdminDB.create_menu(
+    created_menu = await MenuAdminDB.create_menu(
         code=menu_data.code,
         name=menu_data.name,
         path=menu_data.path,
@@ -136,30 +123,16 @@ async def create_menu(
         parent_id=menu_data.parent_id,
     )
     
-    if not menu_id:
+    if not created_menu:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create menu",
         )
     
-    # Get created menu
-    created_menu = MenuAdminDB.get_by_id(menu_id)
-    return MenuResponse(
-        id=UUID(created_menu["id"]),
-        code=created_menu["code"],
-        name=created_menu["name"],
-        path=created_menu.get("path"),
-        icon=created_menu.get("icon"),
-        component=created_menu.get("component"),
-        menu_type=created_menu.get("menu_type", "menu"),
-        permission_code=created_menu.get("permission_code"),
-        is_visible=created_menu.get("is_visible", True),
-        parent_id=UUID(created_menu["parent_id"]) if created_menu.get("parent_id") else None,
-        is_system=created_menu.get("is_system", False),
-        sort_order=created_menu.get("sort_order", 0),
-        created_at=created_menu.get("created_at").isoformat() if created_menu.get("created_at") else None,
-        updated_at=created_menu.get("updated_at").isoformat() if created_menu.get("updated_at") else None,
-        children=[],
+    # Rows from the DB are trusted; skip response_model re-validation
+    return ORJSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=_prepare_menu_row(created_menu),
     )
 
 
@@ -171,7 +144,7 @@ async def update_menu(
 ):
     """Update menu information."""
     # Check if menu exists
-    existing = MenuAdminDB.get_by_id(menu_id)
+    existing = await MenuAdminDB.get_by_id(menu_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -185,7 +158,7 @@ async def update_menu(
             detail="Cannot update system menu",
         )
     
-    success = MenuAdminDB.update_menu(
+    updated_menu = await MenuAdminDB.update_menu(
         menu_id=menu_id,
         code=menu_data.code,
         name=menu_data.name,
@@ -199,31 +172,13 @@ async def update_menu(
         sort_order=menu_data.sort_order,
     )
     
-    if not success:
+    if not updated_menu:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update menu",
         )
     
-    # Get updated menu
-    updated_menu = MenuAdminDB.get_by_id(menu_id)
-    return MenuResponse(
-        id=UUID(updated_menu["id"]),
-        code=updated_menu["code"],
-        name=updated_menu["name"],
-        path=updated_menu.get("path"),
-        icon=updated_menu.get("icon"),
-        component=updated_menu.get("component"),
-        menu_type=updated_menu.get("menu_type", "menu"),
-        permission_code=updated_menu.get("permission_code"),
-        is_visible=updated_menu.get("is_visible", True),
-        parent_id=UUID(updated_menu["parent_id"]) if updated_menu.get("parent_id") else None,
-        is_system=updated_menu.get("is_system", False),
-        sort_order=updated_menu.get("sort_order", 0),
-        created_at=updated_menu.get("created_at").isoformat() if updated_menu.get("created_at") else None,
-        updated_at=updated_menu.get("updated_at").isoformat() if updated_menu.get("updated_at") else None,
-        children=[],
-    )
+    return ORJSONResponse(content=_prepare_menu_row(updated_menu))
 
 
 @router.delete("/{menu_id}")
@@ -232,23 +187,23 @@ async def delete_menu(
     current_user: CurrentUser = Depends(require_permission("menu:delete")),
 ):
     """Delete a menu (only non-system menus can be deleted)."""
-    # Check if menu exists
-    existing = MenuAdminDB.get_by_id(menu_id)
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Menu not found",
-        )
-    
-    # Prevent deleting system menus
-    if existing.get("is_system"):
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot delete system menu",
-        )
-    
-    success = MenuAdminDB.delete_menu(menu_id)
+    success = await MenuAdminDB.delete_menu(menu_id)
     if not success:
+        # Nothing was deleted; look the menu up only now to report why
+        existing = await MenuAdminDB.get_by_id(menu_id)
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Menu not found",
+            )
+        
+        # Prevent deleting system menus
+        if existing.get("is_system"):
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Cannot delete system menu",
+            )
+        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete menu",
@@ -9,41 +9,21 @@ import logging
 from typing import List, Optional
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
 
-from src.config.loader import get_str_env
+from ._db import fetch_all, fetch_one, get_db_connection
 
 logger = logging.getLogger(__name__)
 
-
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
-
-
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
-    )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+# Flat menu lists keyed on the ``include_system`` flag; cleared on every write
+_list_cache: TTLCache = TTLCache(maxsize=2, ttl=30)
 
 
 class MenuAdminDB:
     """Menu management database operations."""
     
     @staticmethod
-    def create_menu(
+    async def create_menu(
         code: str,
         name: str,
         path: Optional[str] = None,
@@ -53,46 +33,42 @@ class MenuAdminDB:
         permission_code: Optional[str] = None,
         is_visible: bool = True,
         parent_id: Optional[UUID] = None,
-    ) -> Optional[UUID]:
-        """Create a new menu."""
+    ) -> Optional[dict]:
+        """Create a new menu and return the inserted row."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get max sort_order for parent
-                    if parent_id:
-                        cursor.execute(
-                            "SELECT COALESCE(MAX(sort_order), 0) + 1 as next_order FROM menus WHERE parent_id = %s",
-                            (str(parent_id),)
-                        )
-                    else:
-                        cursor.execute("SELECT COALESCE(MAX(sort_order), 0) + 1 as next_order FROM menus WHERE parent_id IS NULL")
-                    next_order = cursor.fetchone()["next_order"]
-                    
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # Next sort_order under the same parent is computed in the INSERT
+                    await cursor.execute(
                         """
                         INSERT INTO menus (
                             code, name, path, icon, component, menu_type,
                             permission_code, is_visible, parent_id, sort_order
                         )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
+                        VALUES (
+                            %s, %s, %s, %s, %s, %s, %s, %s, %s,
+                            (
+                                SELECT COALESCE(MAX(sort_order), 0) + 1
+                                FROM menus
+                                WHERE parent_id IS NOT DISTINCT FROM %s
+                            )
+                        )
+                        RETURNING *
                         """,
                         (
                             code, name, path, icon, component, menu_type,
-                            permission_code, is_visible,
-                            str(parent_id) if parent_id else None,
-                            next_order
+                            permission_code, is_visible, parent_id, parent_id
                         )
                     )
-                    menu_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(menu_id)
+                    menu = await cursor.fetchone()
+                    _list_cache.clear()
+                    return menu
         except Exception as e:
             logger.error(f"Error creating menu: {e}")
             return None
     
     @staticmethod
-    def update_menu(
+    async def update_menu(
         menu_id: UUID,
         code: Optional[str] = None,
         name: Optional[str] = None,
@@ -104,111 +80,118 @@ class MenuAdminDB:
         is_visible: Optional[bool] = None,
         parent_id: Optional[UUID] = None,
         sort_order: Optional[int] = None,
-    ) -> bool:
-        """Update menu information."""
+    ) -> Optional[dict]:
+        """Update menu information and return the updated row.
+
+        Fields left as ``None`` keep their current value.
+        """
         try:
-            updates = []
-            values = []
-            
-            if code is not None:
-                updates.append("code = %s")
-                values.append(code)
-            if name is not None:
-                updates.append("name = %s")
-                values.append(name)
-            if path is not None:
-                updates.append("path = %s")
-                values.append(path)
-            if icon is not None:
-                updates.append("icon = %s")
-                values.append(icon)
-            if component is not None:
-                updates.append("component = %s")
-                values.append(component)
-            if menu_type is not None:
-                updates.append("menu_type = %s")
-                values.append(menu_type)
-            if permission_code is not None:
-                updates.append("permission_code = %s")
-                values.append(permission_code)
-            if is_visible is not None:
-                updates.append("is_visible = %s")
-                values.append(is_visible)
-            if parent_id is not None:
-                updates.append("parent_id = %s")
-                values.append(str(parent_id) if parent_id else None)
-            if sort_order is not None:
-                updates.append("sort_order = %s")
-                values.append(sort_order)
-            
-            if not updates:
-                return True
-            
-            updates.append("updated_at = NOW()")
-            values.append(str(menu_id))
-            
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        f"""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # One static statement so every partial update shares a prepared plan
+                    await cursor.execute(
+                        """
                         UPDATE menus
-                        SET {', '.join(updates)}
+                        SET code = COALESCE(%s, code),
+                            name = COALESCE(%s, name),
+                            path = COALESCE(%s, path),
+                            icon = COALESCE(%s, icon),
+                            component = COALESCE(%s, component),
+                            menu_type = COALESCE(%s, menu_type),
+                            permission_code = COALESCE(%s, permission_code),
+                            is_visible = COALESCE(%s, is_visible),
+                            parent_id = COALESCE(%s, parent_id),
+                            sort_order = COALESCE(%s, sort_order),
+                            updated_at = NOW()
                         WHERE id = %s AND is_system = false
+                        RETURNING *
                         """,
-                        values
+                        (
+                            code, name, path, icon, component, menu_type,
+                            permission_code, is_visible,
+                            parent_id,
+                            sort_order, menu_id,
+                        ),
+                        prepare=True,
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    menu = await cursor.fetchone()
+                    _list_cache.clear()
+                    return menu
         except Exception as e:
             logger.error(f"Error updating menu: {e}")
-            return False
+            return None
     
     @staticmethod
-    def delete_menu(menu_id: UUID) -> bool:
+    async def delete_menu(menu_id: UUID) -> bool:
         """Delete a menu (only non-system menus can be deleted)."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         DELETE FROM menus
                         WHERE id = %s AND is_system = false
+                        RETURNING id
                         """,
-                        (str(menu_id),)
+                        (menu_id,)
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    deleted = await cursor.fetchone()
+                    _list_cache.clear()
+                    return deleted is not None
         except Exception as e:
             logger.error(f"Error deleting menu: {e}")
             return False
     
     @staticmethod
-    def get_by_id(menu_id: UUID) -> Optional[dict]:
+    async def get_by_id(menu_id: UUID) -> Optional[dict]:
         """Get menu by ID."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT * FROM menus WHERE id = %s",
-                        (str(menu_id),)
-                    )
-                    return cursor.fetchone()
+            return await fetch_one(
+                "SELECT * FROM menus WHERE id = %s",
+                (menu_id,),
+                prepare=True,
+            )
         except Exception as e:
             logger.error(f"Error getting menu by ID: {e}")
             return None
     
     @staticmethod
-    def list_all(include_system: bool = True) -> List[dict]:
-        """List all menus."""
+    async def get_subtree(menu_id: UUID) -> List[dict]:
+        """Get a menu and all of its descendants."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    if include_system:
-                        cursor.execute("SELECT * FROM menus ORDER BY sort_order, name")
-                    else:
-                        cursor.execute("SELECT * FROM menus WHERE is_system = false ORDER BY sort_order, name")
-                    return cursor.fetchall()
+            return await fetch_all(
+                """
+                WITH RECURSIVE subtree AS (
+                    SELECT * FROM menus WHERE id = %s
+                    UNION ALL
+                    SELECT m.* FROM menus m
+                    INNER JOIN subtree s ON m.parent_id = s.id
+                )
+                SELECT * FROM subtree ORDER BY sort_order, name
+                """,
+                (menu_id,),
+                prepare=True,
+            )
+        except Exception as e:
+            logger.error(f"Error getting menu subtree: {e}")
+            return []
+    
+    @staticmethod
+    async def list_all(include_system: bool = True) -> List[dict]:
+        """List all menus (served from a short-lived cache between writes)."""
+        cached = _list_cache.get(include_system)
+        if cached is not None:
+            return cached
+        try:
+            if include_system:
+                menus = await fetch_all("SELECT * FROM menus ORDER BY sort_order, name", prepare=True)
+            else:
+                menus = await fetch_all(
+                    "SELECT * FROM menus WHERE is_system = false ORDER BY sort_order, name",
+                    prepare=True,
+                )
+            _list_cache[include_system] = menus
+            return menus
         except Exception as e:
             logger.error(f"Error listing menus: {e}")
             return []
-
@@ -6,13 +6,15 @@ Organization management API routes.
 """
 
 import logging
-from typing import List, Optional
+from operator import itemgetter
+from typing import Dict, List, Optional
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Query, status
 
 from ..dependencies import CurrentUser, require_permission
 from ..models import OrganizationCreate, OrganizationResponse, OrganizationBase
+from ._responses import ORJSONResponse
 from .organizations import OrganizationDB
 
 logger = logging.getLogger(__name__)
@@ -20,92 +22,86 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/admin/organizations", tags=["admin", "organizations"])
 
 
+# Columns copied from an organization row into its response node, in response order
+_ORG_FIELDS = (
+    "id", "code", "name", "description", "parent_id", "is_active",
+    "sort_order", "created_at", "updated_at",
+)
+_org_values = itemgetter(*_ORG_FIELDS)
+
+
+def _prepare_org_row(org: dict) -> dict:
+    """Convert an organization row into a response node once, coercing IDs to UUID.
+
+    Rows come from ``SELECT *``/``RETURNING *`` so every column is present;
+    timestamps stay datetimes for ORJSONResponse to serialize natively.
+    """
+    node = dict(zip(_ORG_FIELDS, _org_values(org)))
+    if not isinstance(node["id"], UUID):
+        node["id"] = UUID(str(node["id"]))
+    raw_parent = node["parent_id"]
+    if raw_parent is not None and not isinstance(raw_parent, UUID):
+        node["parent_id"] = UUID(str(raw_parent))
+    node["children"] = []
+    return node
+
+
+def index_org_tree(orgs: list) -> Dict[UUID, dict]:
+    """Index prepared organization nodes by ID and link every node to its parent in a single pass.
+
+    Rows must already be ordered by ``sort_order, name`` (as the DB queries
+    return them); children are appended in that order, so no sorting is needed.
+    """
+    nodes: Dict[UUID, dict] = {}
+    for org in orgs:
+        node = _prepare_org_row(org)
+        nodes[node["id"]] = node
+    for node in nodes.values():
+        parent = nodes.get(node["parent_id"]) if node["parent_id"] else None
+        if parent is not None:
+            parent["children"].append(node)
+    return nodes
+
+
 def build_org_tree(orgs: list, parent_id: Optional[UUID] = None) -> list:
     """Build organization tree structure."""
-    result = []
-    for org in orgs:
-        raw_parent = org.get("parent_id")
-        org_parent_id = (
-            raw_parent
-            if isinstance(raw_parent, UUID)
-            else (UUID(str(raw_parent)) if raw_parent else None)
-        )
-        if org_parent_id == parent_id:
-            org_dict = OrganizationResponse(
-                id=org["id"] if isinstance(org["id"], UUID) else UUID(str(org["id"])),
-                code=org["code"],
-                name=org["name"],
-                description=org.get("description"),
-                parent_id=org_parent_id,
-                is_active=org.get("is_active", True),
-                sort_order=org.get("sort_order", 0),
-                created_at=org.get("created_at").isoformat() if org.get("created_at") else None,
-                updated_at=org.get("updated_at").isoformat() if org.get("updated_at") else None,
-                children=build_org_tree(
-                    orgs,
-                    org["id"] if isinstance(org["id"], UUID) else UUID(str(org["id"])),
-                ),
-            )
-            result.append(org_dict)
-    return sorted(result, key=lambda x: x.sort_order)
+    nodes = index_org_tree(orgs)
+    return [node for node in nodes.values() if node["parent_id"] == parent_id]
 
 
-@router.get("", response_model=List[OrganizationResponse])
+@router.get("", responses={200: {"model": List[OrganizationResponse]}})
 async def list_organizations(
     include_inactive: bool = Query(False),
     current_user: CurrentUser = Depends(require_permission("organization:read")),
 ):
     """List all organizations as a tree structure."""
-    orgs = OrganizationDB.list_all(include_inactive=include_inactive)
+    orgs = await OrganizationDB.list_all(include_inactive=include_inactive)
     orgs_tree = build_org_tree(orgs)
-    return orgs_tree
+    return ORJSONResponse(content=orgs_tree)
 
 
-@router.get("/{org_id}", response_model=OrganizationResponse)
+@router.get("/{org_id}", responses={200: {"model": OrganizationResponse}})
 async def get_organization(
     org_id: UUID,
     current_user: CurrentUser = Depends(require_permission("organization:read")),
 ):
     """Get organization by ID."""
-    org_data = OrganizationDB.get_by_id(org_id)
-    if not org_data:
+    # The subtree query returns the requested organization and its descendants
+    subtree = await OrganizationDB.get_subtree(org_id)
+    if not subtree:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found",
         )
     
-    # Get all orgs to build tree
-    all_orgs = OrganizationDB.list_all(include_inactive=True)
-    orgs_tree = build_org_tree(all_orgs)
-    
-    # Find the org in tree
-    def find_org(orgs_list: List[OrganizationResponse], target_id: UUID) -> Optional[OrganizationResponse]:
-        for org in orgs_list:
-            if org.id == target_id:
-                return org
-            if org.children:
-                found = find_org(org.children, target_id)
-                if found:
-                    return found
-        return None
-    
-    org = find_org(orgs_tree, org_id)
+    org = index_org_tree(subtree).get(org_id)
     if not org:
-        # Return flat org if not found in tree
-        return OrganizationResponse(
-            id=UUID(org_data["id"]),
-            code=org_data["code"],
-            name=org_data["name"],
-            description=org_data.get("description"),
-            parent_id=UUID(org_data["parent_id"]) if org_data.get("parent_id") else None,
-            is_active=org_data.get("is_active", True),
-            sort_order=org_data.get("sort_order", 0),
-            created_at=org_data.get("created_at").isoformat() if org_data.get("created_at") else None,
-            updated_at=org_data.get("updated_at").isoformat() if org_data.get("updated_at") else None,
-            children=[],
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="Tree inconsistency",
         )
     
-    return org
+    return ORJSONResponse(content=org)
 
 
 @router.post("", response_model=OrganizationResponse, status_code=status.HTTP_201_CREATED)
@@ -115,38 +111,30 @@ async def create_organization(
 ):
     """Create a new organization."""
     # Check if code already exists
-    existing = OrganizationDB.get_by_code(org_data.code)
+    existing = await OrganizationDB.get_by_code(org_data.code)
     if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Organization code already exists",
         )
     
-    org_id = OrganizationDB.create(
+    created = await OrganizationDB.create(
         code=org_data.code,
         name=org_data.name,
         description=org_data.description,
         parent_id=org_data.parent_id,
         is_active=org_data.is_active,
     )
-    if not org_id:
+    if not created:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create organization",
         )
     
-    created = OrganizationDB.get_by_id(org_id)
-    return OrganizationResponse(
-        id=UUID(created["id"]),
-        code=created["code"],
-        name=created["name"],
-        description=created.get("description"),
-        parent_id=UUID(created["parent_id"]) if created.get("parent_id") else None,
-        is_active=created.get("is_active", True),
-        sort_order=created.get("sort_order", 0),
-        created_at=created.get("created_at").isoformat() if created.get("created_at") else None,
-        updated_at=created.get("updated_at").isoformat() if created.get("updated_at") else None,
-        children=[],
+    # Rows from the DB are trusted; skip response_model re-validation
+    return ORJSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=_prepare_org_row(created),
     )
 
 
@@ -157,14 +145,14 @@ async def update_organization(
     current_user: CurrentUser = Depends(require_permission("organization:update")),
 ):
     """Update organization information."""
-    existing = OrganizationDB.get_by_id(org_id)
+    existing = await OrganizationDB.get_by_id(org_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Organization not found",
         )
     
-    success = OrganizationDB.update(
+    updated = await OrganizationDB.update(
         org_id=org_id,
         code=org_data.code,
         name=org_data.name,
@@ -172,25 +160,13 @@ async def update_organization(
         parent_id=org_data.parent_id,
         is_active=org_data.is_active,
     )
-    if not success:
+    if not updated:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update organization",
         )
     
-    updated = OrganizationDB.get_by_id(org_id)
-    return OrganizationResponse(
-        id=UUID(updated["id"]),
-        code=updated["code"],
-        name=updated["name"],
-        description=updated.get("description"),
-        parent_id=UUID(updated["parent_id"]) if updated.get("parent_id") else None,
-        is_active=updated.get("is_active", True),
-        sort_order=updated.get("sort_order", 0),
-        created_at=updated.get("created_at").isoformat() if updated.get("created_at") else None,
-        updated_at=updated.get("updated_at").isoformat() if updated.get("updated_at") else None,
-        children=[],
-    )
+    return ORJSONResponse(content=_prepare_org_row(updated))
 
 
 @router.delete("/{org_id}")
@@ -199,15 +175,16 @@ async def delete_organization(
     current_user: CurrentUser = Depends(require_permission("organization:delete")),
 ):
     """Delete an organization."""
-    existing = OrganizationDB.get_by_id(org_id)
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Organization not found",
-        )
-    
-    success = OrganizationDB.delete(org_id)
+    success = await OrganizationDB.delete(org_id)
     if not success:
+        # Nothing was deleted; look the organization up only now to report why
+        existing = await OrganizationDB.get_by_id(org_id)
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Organization not found",
+            )
+        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete organization",
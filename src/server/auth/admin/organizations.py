@@ -6,238 +6,310 @@ Organization database operations.
 """
 
 import logging
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
 
-from src.config.loader import get_str_env
+from ._db import as_uuid, fetch_all, fetch_one, get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Columns needed to render organization lists and trees; point lookups still use SELECT *
+# (child lookups are served by organizations_sort_idx, see scripts/add_admin_list_indexes.sql)
+_ORG_LIST_COLS = (
+    "id, code, name, description, parent_id, is_active, sort_order, created_at, updated_at"
+)
 
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
-
-
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
+# Insert one organization as the last sibling under its parent
+_INSERT_SQL = """
+    INSERT INTO organizations (
+        code, name, description, parent_id,
+        is_active, sort_order
     )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+    VALUES (
+        %s, %s, %s, %s, %s,
+        (
+            SELECT COALESCE(MAX(sort_order), 0) + 1
+            FROM organizations
+            WHERE parent_id IS NOT DISTINCT FROM %s
+        )
+    )
+    RETURNING *
+"""
+
+# Flat organization lists keyed on the ``include_inactive`` flag; cleared on every write
+_list_cache: TTLCache = TTLCache(maxsize=2, ttl=30)
 
 
 class OrganizationDB:
     """Organization database operations."""
     
     @staticmethod
-    def get_by_id(org_id: UUID) -> Optional[dict]:
+    async def get_by_id(org_id: UUID) -> Optional[dict]:
         """Get organization by ID."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT * FROM organizations
-                        WHERE id = %s
-                        """,
-                        (str(org_id),)
-                    )
-                    return cursor.fetchone()
+            return await fetch_one(
+                """
+                SELECT * FROM organizations
+                WHERE id = %s
+                """,
+                (org_id,),
+                prepare=True,
+            )
         except Exception as e:
-            logger.error(f"Error getting organization by ID: {e}")
+            logger.exception("Error getting organization by ID: %s", e)
             return None
     
     @staticmethod
-    def get_by_code(code: str) -> Optional[dict]:
+    async def get_many(org_ids: Sequence[UUID]) -> Dict[UUID, dict]:
+        """Get several organizations by ID in one query, keyed by ID."""
+        if not org_ids:
+            return {}
+        try:
+            rows = await fetch_all(
+                "SELECT * FROM organizations WHERE id = ANY(%s)",
+                (list(org_ids),),
+                prepare=True,
+            )
+            return {as_uuid(row["id"]): row for row in rows}
+        except Exception as e:
+            logger.exception("Error getting organizations by IDs: %s", e)
+            return {}
+    
+    @staticmethod
+    async def get_by_code(code: str) -> Optional[dict]:
         """Get organization by code."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT * FROM organizations
-                        WHERE code = %s
-                        """,
-                        (code,)
-                    )
-                    return cursor.fetchone()
+            return await fetch_one(
+                """
+                SELECT * FROM organizations
+                WHERE code = %s
+                """,
+                (code,),
+                prepare=True,
+            )
         except Exception as e:
-            logger.error(f"Error getting organization by code: {e}")
+            logger.exception("Error getting organization by code: %s", e)
             return None
     
     @staticmethod
-    def list_all(include_inactive: bool = False) -> List[dict]:
-        """List all organizations."""
+    async def list_all(include_inactive: bool = False) -> List[dict]:
+        """List all organizations (served from a short-lived cache between writes)."""
+        cached = _list_cache.get(include_inactive)
+        if cached is not None:
+            return cached
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    if include_inactive:
-                        cursor.execute("SELECT * FROM organizations ORDER BY sort_order, name")
-                    else:
-                        cursor.execute("SELECT * FROM organizations WHERE is_active = true ORDER BY sort_order, name")
-                    return cursor.fetchall()
+            if include_inactive:
+                orgs = await fetch_all(
+                    f"SELECT {_ORG_LIST_COLS} FROM organizations ORDER BY sort_order, name",
+                    prepare=True,
+                )
+            else:
+                orgs = await fetch_all(
+                    f"SELECT {_ORG_LIST_COLS} FROM organizations WHERE is_active = true ORDER BY sort_order, name",
+                    prepare=True,
+                )
+            _list_cache[include_inactive] = orgs
+            return orgs
         except Exception as e:
-            logger.error(f"Error listing organizations: {e}")
+            logger.exception("Error listing organizations: %s", e)
             return []
     
     @staticmethod
-    def get_children(parent_id: UUID) -> List[dict]:
+    async def get_children(parent_id: UUID) -> List[dict]:
         """Get child organizations."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT * FROM organizations
-                        WHERE parent_id = %s AND is_active = true
-                        ORDER BY sort_order, name
-                        """,
-                        (str(parent_id),)
-                    )
-                    return cursor.fetchall()
+            return await fetch_all(
+                f"""
+                SELECT {_ORG_LIST_COLS} FROM organizations
+                WHERE parent_id = %s AND is_active = true
+                ORDER BY sort_order, name
+                """,
+                (parent_id,),
+                prepare=True,
+            )
+        except Exception as e:
+            logger.exception("Error getting child organizations: %s", e)
+            return []
+
+    @staticmethod
+    async def get_children_many(parent_ids: Sequence[UUID]) -> Dict[UUID, List[dict]]:
+        """Get active child organizations of several parents in one query, grouped by parent ID."""
+        children: Dict[UUID, List[dict]] = {as_uuid(parent_id): [] for parent_id in parent_ids}
+        if not children:
+            return children
+        try:
+            rows = await fetch_all(
+                f"""
+                SELECT {_ORG_LIST_COLS} FROM organizations
+                WHERE parent_id = ANY(%s) AND is_active = true
+                ORDER BY sort_order, name
+                """,
+                (list(children),),
+                prepare=True,
+            )
+            for row in rows:
+                children[as_uuid(row["parent_id"])].append(row)
+            return children
+        except Exception as e:
+            logger.exception("Error getting child organizations: %s", e)
+            return children
+
+    @staticmethod
+    async def get_subtree(org_id: UUID) -> List[dict]:
+        """Get an organization and all of its descendants."""
+        try:
+            return await fetch_all(
+                """
+                WITH RECURSIVE subtree AS (
+                    SELECT * FROM organizations WHERE id = %s
+                    UNION ALL
+                    SELECT o.* FROM organizations o
+                    INNER JOIN subtree s ON o.parent_id = s.id
+                )
+                SELECT * FROM subtree ORDER BY sort_order, name
+                """,
+                (org_id,),
+                prepare=True,
+            )
         except Exception as e:
-            logger.error(f"Error getting child organizations: {e}")
+            logger.exception("Error getting organization subtree: %s", e)
             return []
 
     @staticmethod
-    def create(
+    async def create(
         code: str,
         name: str,
         description: Optional[str] = None,
         parent_id: Optional[UUID] = None,
         is_active: bool = True,
-    ) -> Optional[UUID]:
-        """Create a new organization."""
+    ) -> Optional[dict]:
+        """Create a new organization and return the inserted row."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get next sort_order under the same parent
-                    if parent_id:
-                        cursor.execute(
-                            """
-                            SELECT COALESCE(MAX(sort_order), 0) + 1 AS next_order
-                            FROM organizations
-                            WHERE parent_id = %s
-                            """,
-                            (str(parent_id),),
-                        )
-                    else:
-                        cursor.execute(
-                            """
-                            SELECT COALESCE(MAX(sort_order), 0) + 1 AS next_order
-                            FROM organizations
-                            WHERE parent_id IS NULL
-                            """
-                        )
-                    next_order = cursor.fetchone()["next_order"]
-
-                    cursor.execute(
-                        """
-                        INSERT INTO organizations (
-                            code, name, description, parent_id,
-                            is_active, sort_order
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                        """,
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # Next sort_order under the same parent is computed in the INSERT
+                    await cursor.execute(
+                        _INSERT_SQL,
                         (
                             code,
                             name,
                             description,
-                            str(parent_id) if parent_id else None,
+                            parent_id,
                             is_active,
-                            next_order,
+                            parent_id,
                         ),
                     )
-                    org_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(org_id)
+                    org = await cursor.fetchone()
+                    _list_cache.clear()
+                    return org
         except Exception as e:
-            logger.error(f"Error creating organization: {e}")
+            logger.exception("Error creating organization: %s", e)
             return None
 
     @staticmethod
-    def update(
+    async def bulk_create(orgs: Sequence[dict]) -> List[dict]:
+        """Create several organizations in one pipelined batch and return the inserted rows.
+
+        Each item takes the same keys as ``create``. Rows are inserted in order
+        within one transaction, so siblings get consecutive sort_order values.
+        """
+        if not orgs:
+            return []
+        try:
+            async with get_db_connection() as conn:
+                # All-or-nothing: the pool hands out autocommit connections
+                async with conn.transaction():
+                    async with conn.cursor() as cursor:
+                        await cursor.executemany(
+                            _INSERT_SQL,
+                            [
+                                (
+                                    org["code"],
+                                    org["name"],
+                                    org.get("description"),
+                                    org.get("parent_id"),
+                                    org.get("is_active", True),
+                                    org.get("parent_id"),
+                                )
+                                for org in orgs
+                            ],
+                            returning=True,
+                        )
+                        created = [await cursor.fetchone()]
+                        while cursor.nextset():
+                            created.append(await cursor.fetchone())
+            _list_cache.clear()
+            return created
+        except Exception as e:
+            logger.exception("Error bulk creating organizations: %s", e)
+            return []
+
+    @staticmethod
+    async def update(
         org_id: UUID,
         code: Optional[str] = None,
         name: Optional[str] = None,
         description: Optional[str] = None,
         parent_id: Optional[UUID] = None,
         is_active: Optional[bool] = None,
-    ) -> bool:
-        """Update organization information."""
+    ) -> Optional[dict]:
+        """Update organization information and return the updated row.
+
+        Fields left as ``None`` keep their current value.
+        """
         try:
-            updates = []
-            values: list = []
-
-            if code is not None:
-                updates.append("code = %s")
-                values.append(code)
-            if name is not None:
-                updates.append("name = %s")
-                values.append(name)
-            if description is not None:
-                updates.append("description = %s")
-                values.append(description)
-            if parent_id is not None:
-                updates.append("parent_id = %s")
-                values.append(str(parent_id) if parent_id else None)
-            if is_active is not None:
-                updates.append("is_active = %s")
-                values.append(is_active)
-
-            if not updates:
-                return True
-
-            updates.append("updated_at = NOW()")
-            values.append(str(org_id))
-
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        f"""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # One static statement so every partial update shares a prepared plan
+                    await cursor.execute(
+                        """
                         UPDATE organizations
-                        SET {', '.join(updates)}
+                        SET code = COALESCE(%s, code),
+                            name = COALESCE(%s, name),
+                            description = COALESCE(%s, description),
+                            parent_id = COALESCE(%s, parent_id),
+                            is_active = COALESCE(%s, is_active),
+                            updated_at = NOW()
                         WHERE id = %s
+                        RETURNING *
                         """,
-                        values,
+                        (
+                            code,
+                            name,
+                            description,
+                            parent_id,
+                            is_active,
+                            org_id,
+                        ),
+                        prepare=True,
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    org = await cursor.fetchone()
+                    _list_cache.clear()
+                    return org
         except Exception as e:
-            logger.error(f"Error updating organization: {e}")
-            return False
+            logger.exception("Error updating organization: %s", e)
+            return None
 
     @staticmethod
-    def delete(org_id: UUID) -> bool:
+    async def delete(org_id: UUID) -> bool:
         """Delete an organization.
 
         For simplicity, we perform a hard delete. In production you may want
         to check for children or related data first.
         """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "DELETE FROM organizations WHERE id = %s",
-                        (str(org_id),),
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM organizations WHERE id = %s RETURNING id",
+                        (org_id,),
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    deleted = await cursor.fetchone()
+                    _list_cache.clear()
+                    return deleted is not None
         except Exception as e:
-            logger.error(f"Error deleting organization: {e}")
+            logger.exception("Error deleting organization: %s", e)
             return False
 
@@ -6,13 +6,17 @@ Permission management API routes.
 """
 
 import logging
-from typing import List, Optional
+from operator import itemgetter
+from typing import AsyncIterator, List, Optional
 from uuid import UUID
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
 
 from ..dependencies import CurrentUser, require_permission
 from ..models import PermissionCreate, PermissionResponse
+from ._responses import ORJSON_OPTIONS, ORJSONResponse
 from .permissions import PermissionAdminDB
 
 logger = logging.getLogger(__name__)
@@ -20,7 +24,47 @@ logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/api/admin/permissions", tags=["admin", "permissions"])
 
 
-@router.get("", response_model=List[PermissionResponse])
+# Columns copied from a permission row into its response, in response order
+_PERMISSION_FIELDS = (
+    "id", "code", "name", "resource", "action", "description", "is_system", "created_at",
+)
+_permission_values = itemgetter(*_PERMISSION_FIELDS)
+
+# Pages larger than this are streamed from a server-side cursor instead of fetched whole
+_STREAM_THRESHOLD = 1000
+
+
+def _prepare_permission_row(perm: dict) -> dict:
+    """Convert a permission row into a response dict.
+
+    psycopg already returns UUIDs and datetimes, which ORJSONResponse
+    serializes natively, so no per-field conversion is needed.
+    """
+    return dict(zip(_PERMISSION_FIELDS, _permission_values(perm)))
+
+
+async def _stream_permission_array(
+    first: List[dict],
+    batches: AsyncIterator[List[dict]],
+) -> AsyncIterator[bytes]:
+    """Encode permission row batches as a single JSON array, one batch at a time."""
+    try:
+        yield b"["
+        rows = first
+        separator = b""
+        while rows:
+            yield separator + b",".join(
+                orjson.dumps(_prepare_permission_row(perm), option=ORJSON_OPTIONS) for perm in rows
+            )
+            separator = b","
+            rows = await anext(batches, [])
+        yield b"]"
+    finally:
+        # Release the pooled connection even if the client disconnects mid-stream
+        await batches.aclose()
+
+
+@router.get("", responses={200: {"model": List[PermissionResponse]}})
 async def list_permissions(
     limit: int = Query(1000, ge=1, le=10000),
     offset: int = Query(0, ge=0),
@@ -28,52 +72,59 @@ async def list_permissions(
     include_system: bool = Query(True),
     current_user: CurrentUser = Depends(require_permission("permission:read")),
 ):
-    """List permissions with filters."""
-    permissions = PermissionAdminDB.list_permissions(
+    """List permissions with filters.
+
+    The total number of matching permissions is returned in ``X-Total-Count``.
+    Large pages are streamed rather than built in memory.
+    """
+    if limit > _STREAM_THRESHOLD:
+        batches = PermissionAdminDB.iter_permissions(
+            limit=limit,
+            offset=offset,
+            resource=resource,
+            include_system=include_system,
+        )
+        # The first batch carries the total needed for the header
+        first = await anext(batches, [])
+        if first:
+            total = first[0]["total"]
+        elif offset:
+            total = await PermissionAdminDB.count_permissions(resource, include_system)
+        else:
+            total = 0
+        return StreamingResponse(
+            _stream_permission_array(first, batches),
+            media_type="application/json",
+            headers={"X-Total-Count": str(total)},
+        )
+    
+    permissions, total = await PermissionAdminDB.list_permissions(
         limit=limit,
         offset=offset,
         resource=resource,
         include_system=include_system,
     )
     
-    return [
-        PermissionResponse(
-            id=perm["id"] if isinstance(perm["id"], UUID) else UUID(str(perm["id"])),
-            code=perm["code"],
-            name=perm["name"],
-            resource=perm["resource"],
-            action=perm["action"],
-            description=perm.get("description"),
-            is_system=perm.get("is_system", False),
-            created_at=perm.get("created_at").isoformat() if perm.get("created_at") else None,
-        )
-        for perm in permissions
-    ]
+    return ORJSONResponse(
+        content=[_prepare_permission_row(perm) for perm in permissions],
+        headers={"X-Total-Count": str(total)},
+    )
 
 
-@router.get("/{permission_id}", response_model=PermissionResponse)
+@router.get("/{permission_id}", responses={200: {"model": PermissionResponse}})
 async def get_permission(
     permission_id: UUID,
     current_user: CurrentUser = Depends(require_permission("permission:read")),
 ):
     """Get permission by ID."""
-    perm_data = PermissionAdminDB.get_by_id(permission_id)
+    perm_data = await PermissionAdminDB.get_by_id(permission_id)
     if not perm_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Permission not found",
         )
     
-    return PermissionResponse(
-        id=perm_data["id"] if isinstance(perm_data["id"], UUID) else UUID(str(perm_data["id"])),
-        code=perm_data["code"],
-        name=perm_data["name"],
-        resource=perm_data["resource"],
-        action=perm_data["action"],
-        description=perm_data.get("description"),
-        is_system=perm_data.get("is_system", False),
-        created_at=perm_data.get("created_at").isoformat() if perm_data.get("created_at") else None,
-    )
+    return ORJSONResponse(content=_prepare_permission_row(perm_data))
 
 
 @router.post("", response_model=PermissionResponse, status_code=status.HTTP_201_CREATED)
@@ -82,15 +133,7 @@ async def create_permission(
     current_user: CurrentUser = Depends(require_permission("permission:create")),
 ):
     """Create a new permission."""
-    # Check if code already exists
-    existing = PermissionAdminDB.get_by_code(perm_data.code)
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Permission code already exists",
-        )
-    
-    perm_id = PermissionAdminDB.create_permission(
+    created_perm = await PermissionAdminDB.create_permission(
         code=perm_data.code,
         name=perm_data.name,
         resource=perm_data.resource,
@@ -98,22 +141,19 @@ async def create_permission(
         description=perm_data.description,
     )
     
-    if not perm_id:
+    if not created_perm:
+        # Nothing was inserted; a conflicting code is the expected cause
+        if await PermissionAdminDB.get_by_code(perm_data.code):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Permission code already exists",
+            )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create permission",
         )
     
-    # Get created permission
-    created_perm = PermissionAdminDB.get_by_id(perm_id)
-    return PermissionResponse(
-        id=UUID(created_perm["id"]),
-        code=created_perm["code"],
-        name=created_perm["name"],
-        resource=created_perm["resource"],
-        action=created_perm["action"],
-        description=created_perm.get("description"),
-        is_system=created_perm.get("is_system", False),
-        created_at=created_perm.get("created_at").isoformat() if created_perm.get("created_at") else None,
+    return ORJSONResponse(
+        status_code=status.HTTP_201_CREATED,
+        content=_prepare_permission_row(created_perm),
     )
-
@@ -5,135 +5,256 @@
 Permission management database operations.
 """
 
+import asyncio
 import logging
-from typing import List, Optional
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Set, Tuple
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
 
-from src.config.loader import get_str_env
+from ._db import as_uuid, fetch_all, fetch_one, get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Columns needed to render permission lists; point lookups still use SELECT *
+_PERMISSION_LIST_COLS = "id, code, name, resource, action, description, is_system, created_at"
 
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
+# Fixed statement text so every filter combination reuses one prepared plan;
+# the ORDER BY is served by permissions_list_idx (scripts/add_admin_list_indexes.sql)
+_LIST_PERMISSIONS_SQL = f"""
+    SELECT {_PERMISSION_LIST_COLS}, COUNT(*) OVER() AS total FROM permissions
+    WHERE (%s OR is_system = false)
+      AND (%s::text IS NULL OR resource = %s)
+    ORDER BY resource, code
+    LIMIT %s OFFSET %s
+"""
 
+# Same filters as _LIST_PERMISSIONS_SQL, for pages past the end that carry no window count
+_COUNT_PERMISSIONS_SQL = """
+    SELECT COUNT(*) AS total FROM permissions
+    WHERE (%s OR is_system = false)
+      AND (%s::text IS NULL OR resource = %s)
+"""
 
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
-    )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+# Permission lookups keyed on ("code", code) / ("list", filters...); cleared on every write
+_perm_cache: TTLCache = TTLCache(maxsize=512, ttl=60)
+
+
+class PermCodeLoader:
+    """Coalesce permission-by-code lookups made within one event-loop tick.
+
+    Concurrent callers asking for codes in the same tick share a single
+    ``code = ANY(...)`` query; callers asking for the same code share its result.
+    If the query fails, every future in the batch gets the exception.
+    """
+
+    def __init__(self) -> None:
+        self._pending: Dict[str, asyncio.Future] = {}
+        # Strong references so in-flight flush tasks are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def load(self, code: str) -> "asyncio.Future[Optional[dict]]":
+        """Queue a lookup for ``code`` and return a future for its row (or None)."""
+        future = self._pending.get(code)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            if not self._pending:
+                loop.call_soon(self._dispatch)
+            future = loop.create_future()
+            self._pending[code] = future
+        return future
+
+    def _dispatch(self) -> None:
+        batch, self._pending = self._pending, {}
+        task = asyncio.ensure_future(self._flush(batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    @staticmethod
+    async def _flush(batch: Dict[str, asyncio.Future]) -> None:
+        try:
+            rows = await fetch_all(
+                "SELECT * FROM permissions WHERE code = ANY(%s)",
+                (list(batch),),
+                prepare=True,
+            )
+        except Exception as e:
+            # Fail every waiter so an outage is not mistaken for "code not found"
+            logger.exception("Error getting permissions by code: %s", e)
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+        by_code = {row["code"]: row for row in rows}
+        for code, future in batch.items():
+            if not future.done():
+                future.set_result(by_code.get(code))
+
+
+_code_loader = PermCodeLoader()
 
 
 class PermissionAdminDB:
     """Permission management database operations."""
     
     @staticmethod
-    def create_permission(
+    async def create_permission(
         code: str,
         name: str,
         resource: str,
         action: str,
         description: Optional[str] = None,
-    ) -> Optional[UUID]:
-        """Create a new permission."""
+    ) -> Optional[dict]:
+        """Create a new permission and return the inserted row.
+
+        Returns None if a permission with the same code already exists.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         INSERT INTO permissions (code, name, resource, action, description)
                         VALUES (%s, %s, %s, %s, %s)
-                        RETURNING id
+                        ON CONFLICT (code) DO NOTHING
+                        RETURNING *
                         """,
                         (code, name, resource, action, description)
                     )
-                    perm_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(perm_id)
+                    perm = await cursor.fetchone()
+                    _perm_cache.clear()
+                    return perm
         except Exception as e:
-            logger.error(f"Error creating permission: {e}")
+            logger.exception("Error creating permission: %s", e)
             return None
     
     @staticmethod
-    def get_by_id(perm_id: UUID) -> Optional[dict]:
+    async def get_by_id(perm_id: UUID) -> Optional[dict]:
         """Get permission by ID."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT * FROM permissions WHERE id = %s",
-                        (str(perm_id),)
-                    )
-                    return cursor.fetchone()
+            return await fetch_one(
+                "SELECT * FROM permissions WHERE id = %s",
+                (perm_id,),
+                prepare=True,
+            )
         except Exception as e:
-            logger.error(f"Error getting permission by ID: {e}")
+            logger.exception("Error getting permission by ID: %s", e)
             return None
     
     @staticmethod
-    def get_by_code(code: str) -> Optional[dict]:
-        """Get permission by code."""
+    async def get_many(perm_ids: Sequence[UUID]) -> Dict[UUID, dict]:
+        """Get several permissions by ID in one query, keyed by ID."""
+        if not perm_ids:
+            return {}
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "SELECT * FROM permissions WHERE code = %s",
-                        (code,)
-                    )
-                    return cursor.fetchone()
+            rows = await fetch_all(
+                "SELECT * FROM permissions WHERE id = ANY(%s)",
+                (list(perm_ids),),
+                prepare=True,
+            )
+            return {as_uuid(row["id"]): row for row in rows}
         except Exception as e:
-            logger.error(f"Error getting permission by code: {e}")
-            return None
+            logger.exception("Error getting permissions by IDs: %s", e)
+            return {}
     
     @staticmethod
-    def list_permissions(
+    async def get_by_code(code: str) -> Optional[dict]:
+        """Get permission by code.
+
+        Served from a short-lived cache between writes; misses are batched
+        with concurrent lookups through the shared code loader. Database
+        errors are raised, not reported as a missing code.
+        """
+        key = ("code", code)
+        cached = _perm_cache.get(key)
+        if cached is not None:
+            return cached
+        # Shielded so one cancelled caller does not cancel the lookup for the others
+        perm = await asyncio.shield(_code_loader.load(code))
+        if perm is not None:
+            _perm_cache[key] = perm
+        return perm
+    
+    @staticmethod
+    async def list_permissions(
         limit: int = 1000,
         offset: int = 0,
         resource: Optional[str] = None,
         include_system: bool = True,
-    ) -> List[dict]:
-        """List permissions with filters."""
+    ) -> Tuple[List[dict], int]:
+        """List permissions with filters, returning the page and the total match count.
+
+        Served from a short-lived cache between writes. Database errors are
+        logged and re-raised rather than reported as an empty page.
+        """
+        key = ("list", limit, offset, resource, include_system)
+        cached = _perm_cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    conditions = []
-                    params = []
-                    
-                    if not include_system:
-                        conditions.append("is_system = false")
-                    if resource:
-                        conditions.append("resource = %s")
-                        params.append(resource)
-                    
-                    where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
-                    
-                    params.extend([limit, offset])
-                    
-                    cursor.execute(
-                        f"""
-                        SELECT * FROM permissions
-                        {where_clause}
-                        ORDER BY resource, code
-                        LIMIT %s OFFSET %s
-                        """,
-                        params
-                    )
-                    return cursor.fetchall()
+            resource = resource or None
+            permissions = await fetch_all(
+                _LIST_PERMISSIONS_SQL,
+                (include_system, resource, resource, limit, offset),
+                prepare=True,
+            )
+            # The window count is the same on every row; an empty page has no row to carry it
+            if permissions:
+                total = permissions[0]["total"]
+            elif offset:
+                total = await PermissionAdminDB.count_permissions(resource, include_system)
+            else:
+                total = 0
+            _perm_cache[key] = (permissions, total)
+            return permissions, total
+        except Exception as e:
+            logger.exception("Error listing permissions: %s", e)
+            raise
+
+    @staticmethod
+    async def count_permissions(
+        resource: Optional[str] = None,
+        include_system: bool = True,
+    ) -> int:
+        """Count permissions matching the list filters."""
+        resource = resource or None
+        row = await fetch_one(
+            _COUNT_PERMISSIONS_SQL,
+            (include_system, resource, resource),
+            prepare=True,
+        )
+        return row["total"]
+
+    @staticmethod
+    async def iter_permissions(
+        limit: int = 1000,
+        offset: int = 0,
+        resource: Optional[str] = None,
+        include_system: bool = True,
+        chunk_size: int = 500,
+    ) -> AsyncIterator[List[dict]]:
+        """Yield filtered permissions in batches from a server-side cursor.
+
+        Used for large pages so at most ``chunk_size`` rows are held in
+        memory at a time. Each row carries the total match count in ``total``.
+        """
+        try:
+            async with get_db_connection() as conn:
+                # Named cursors need a transaction; pooled connections are autocommit
+                async with conn.transaction():
+                    async with conn.cursor(name="permissions_stream") as cursor:
+                        cursor.itersize = chunk_size
+                        await cursor.execute(
+                            _LIST_PERMISSIONS_SQL,
+                            (include_system, resource or None, resource or None, limit, offset),
+                        )
+                        while True:
+                            rows = await cursor.fetchmany(chunk_size)
+                            if not rows:
+                                break
+                            yield rows
         except Exception as e:
-            logger.error(f"Error listing permissions: {e}")
-            return []
+            # Re-raise so a failed stream is aborted rather than closed as a valid array
+            logger.exception("Error streaming permissions: %s", e)
+            raise
 
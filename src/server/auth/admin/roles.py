@@ -6,83 +6,96 @@ Role management database operations.
 """
 
 import logging
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
+from psycopg.errors import ForeignKeyViolation
 
-from src.config.loader import get_str_env
+from ._db import get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Role rows keyed on role ID; entries are dropped when the role is updated or deleted
+_role_cache: TTLCache = TTLCache(maxsize=1024, ttl=30)
+# Role list pages keyed on the list filters; cleared on every role write
+_list_cache: TTLCache = TTLCache(maxsize=64, ttl=5)
 
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
-
-
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
+# Insert a role as the last in sort order and link its permissions and menus;
+# a duplicate code inserts nothing and returns no row
+_CREATE_ROLE_SQL = """
+    WITH new_role AS (
+        INSERT INTO roles (
+            code, name, description, organization_id,
+            data_permission_level, is_active, sort_order
+        )
+        VALUES (
+            %s, %s, %s, %s, %s, %s,
+            (SELECT COALESCE(MAX(sort_order), 0) + 1 FROM roles)
+        )
+        ON CONFLICT (code) DO NOTHING
+        RETURNING *
+    ),
+    new_permissions AS (
+        INSERT INTO role_permissions (role_id, permission_id)
+        SELECT new_role.id, unnest(%s::uuid[]) FROM new_role
+        ON CONFLICT DO NOTHING
+    ),
+    new_menus AS (
+        INSERT INTO role_menus (role_id, menu_id)
+        SELECT new_role.id, unnest(%s::uuid[]) FROM new_role
+        ON CONFLICT DO NOTHING
     )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+    SELECT * FROM new_role
+"""
 
 
 class RoleAdminDB:
     """Role management database operations."""
     
     @staticmethod
-    def create_role(
+    async def create_role(
         code: str,
         name: str,
         description: Optional[str] = None,
         organization_id: Optional[UUID] = None,
         data_permission_level: str = "self",
         is_active: bool = True,
-    ) -> Optional[UUID]:
-        """Create a new role."""
+        permission_ids: Optional[Sequence[UUID]] = None,
+        menu_ids: Optional[Sequence[UUID]] = None,
+    ) -> Optional[dict]:
+        """Create a new role with its permissions and menus, returning the inserted row.
+
+        Returns None if a role with the same code already exists. Raises
+        ``ForeignKeyViolation`` if the organization, a permission or a menu
+        id does not exist.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get max sort_order
-                    cursor.execute("SELECT COALESCE(MAX(sort_order), 0) + 1 as next_order FROM roles")
-                    next_order = cursor.fetchone()["next_order"]
-                    
-                    cursor.execute(
-                        """
-                        INSERT INTO roles (
-                            code, name, description, organization_id,
-                            data_permission_level, is_active, sort_order
-                        )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
-                        """,
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # One statement: role, permission links and menu links commit together
+                    await cursor.execute(
+                        _CREATE_ROLE_SQL,
                         (
-                            code, name, description,
-                            str(organization_id) if organization_id else None,
-                            data_permission_level, is_active, next_order
-                        )
+                            code, name, description, organization_id,
+                            data_permission_level, is_active,
+                            list(permission_ids or []),
+                            list(menu_ids or []),
+                        ),
+                        prepare=True
                     )
-                    role_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(role_id)
+                    role = await cursor.fetchone()
+                    _list_cache.clear()
+                    return role
+        except ForeignKeyViolation:
+            # A bad id in the request, not a server failure; the route answers 400
+            raise
         except Exception as e:
             logger.error(f"Error creating role: {e}")
             return None
     
     @staticmethod
-    def update_role(
+    async def update_role(
         role_id: UUID,
         code: Optional[str] = None,
         name: Optional[str] = None,
@@ -90,153 +103,211 @@ class RoleAdminDB:
         organization_id: Optional[UUID] = None,
         data_permission_level: Optional[str] = None,
         is_active: Optional[bool] = None,
-    ) -> bool:
-        """Update role information."""
+    ) -> Optional[dict]:
+        """Update role information and return the updated row.
+
+        Fields left as ``None`` keep their current value. Returns None if the
+        role does not exist, is a system role, or the update failed.
+        """
         try:
-            updates = []
-            values = []
-            
-            if code is not None:
-                updates.append("code = %s")
-                values.append(code)
-            if name is not None:
-                updates.append("name = %s")
-                values.append(name)
-            if description is not None:
-                updates.append("description = %s")
-                values.append(description)
-            if organization_id is not None:
-                updates.append("organization_id = %s")
-                values.append(str(organization_id))
-            if data_permission_level is not None:
-                updates.append("data_permission_level = %s")
-                values.append(data_permission_level)
-            if is_active is not None:
-                updates.append("is_active = %s")
-                values.append(is_active)
-            
-            if not updates:
-                return True
-            
-            updates.append("updated_at = NOW()")
-            values.append(str(role_id))
-            
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        f"""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # One static statement; RETURNING * saves a follow-up read
+                    await cursor.execute(
+                        """
                         UPDATE roles
-                        SET {', '.join(updates)}
+                        SET code = COALESCE(%s, code),
+                            name = COALESCE(%s, name),
+                            description = COALESCE(%s, description),
+                            organization_id = COALESCE(%s, organization_id),
+                            data_permission_level = COALESCE(%s, data_permission_level),
+                            is_active = COALESCE(%s, is_active),
+                            updated_at = NOW()
                         WHERE id = %s AND is_system = false
+                        RETURNING *
                         """,
-                        values
+                        (
+                            code, name, description, organization_id,
+                            data_permission_level, is_active, role_id,
+                        ),
+                        prepare=True
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    role = await cursor.fetchone()
+                    _role_cache.pop(role_id, None)
+                    _list_cache.clear()
+                    return role
         except Exception as e:
             logger.error(f"Error updating role: {e}")
-            return False
+            return None
     
     @staticmethod
-    def delete_role(role_id: UUID) -> bool:
+    async def delete_role(role_id: UUID) -> bool:
         """Delete a role (only non-system roles can be deleted)."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         DELETE FROM roles
                         WHERE id = %s AND is_system = false
                         """,
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    conn.commit()
+                    _role_cache.pop(role_id, None)
+                    _list_cache.clear()
                     return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting role: {e}")
             return False
     
     @staticmethod
-    def assign_permissions(role_id: UUID, permission_ids: List[UUID]) -> bool:
-        """Assign permissions to a role."""
+    async def assign_permissions(role_id: UUID, permission_ids: List[UUID]) -> bool:
+        """Assign permissions to a role.
+
+        Returns False if the role does not exist or the write failed.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
+            async with get_db_connection() as conn:
+                # Pipelined: BEGIN, the existence check, DELETE, INSERT and COMMIT
+                # go out without waiting on each other; pooled connections are autocommit
+                async with conn.pipeline(), conn.transaction():
+                    found = await conn.execute(
+                        "SELECT EXISTS (SELECT 1 FROM roles WHERE id = %s) AS found",
+                        (role_id,),
+                        prepare=True
+                    )
                     # Remove existing permissions
-                    cursor.execute(
+                    await conn.execute(
                         "DELETE FROM role_permissions WHERE role_id = %s",
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    # Add new permissions
+                    # Add new permissions; joining roles makes this a no-op for a missing role
                     if permission_ids:
-                        cursor.executemany(
+                        # The whole list is bound as one array parameter
+                        await conn.execute(
                             """
                             INSERT INTO role_permissions (role_id, permission_id)
-                            VALUES (%s, %s)
+                            SELECT r.id, item_id
+                            FROM roles r, unnest(%s::uuid[]) AS item_id
+                            WHERE r.id = %s
                             ON CONFLICT DO NOTHING
                             """,
-                            [(str(role_id), str(perm_id)) for perm_id in permission_ids]
+                            (list(permission_ids), role_id),
+                            prepare=True
                         )
-                    conn.commit()
-                    return True
+                return (await found.fetchone())["found"]
         except Exception as e:
             logger.error(f"Error assigning permissions: {e}")
             return False
     
     @staticmethod
-    def assign_menus(role_id: UUID, menu_ids: List[UUID]) -> bool:
-        """Assign menus to a role."""
+    async def assign_menus(role_id: UUID, menu_ids: List[UUID]) -> bool:
+        """Assign menus to a role.
+
+        Returns False if the role does not exist or the write failed.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
+            async with get_db_connection() as conn:
+                # Pipelined: BEGIN, the existence check, DELETE, INSERT and COMMIT
+                # go out without waiting on each other; pooled connections are autocommit
+                async with conn.pipeline(), conn.transaction():
+                    found = await conn.execute(
+                        "SELECT EXISTS (SELECT 1 FROM roles WHERE id = %s) AS found",
+                        (role_id,),
+                        prepare=True
+                    )
                     # Remove existing menus
-                    cursor.execute(
+                    await conn.execute(
                         "DELETE FROM role_menus WHERE role_id = %s",
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    # Add new menus
+                    # Add new menus; joining roles makes this a no-op for a missing role
                     if menu_ids:
-                        cursor.executemany(
+                        # The whole list is bound as one array parameter
+                        await conn.execute(
                             """
                             INSERT INTO role_menus (role_id, menu_id)
-                            VALUES (%s, %s)
+                            SELECT r.id, item_id
+                            FROM roles r, unnest(%s::uuid[]) AS item_id
+                            WHERE r.id = %s
                             ON CONFLICT DO NOTHING
                             """,
-                            [(str(role_id), str(menu_id)) for menu_id in menu_ids]
+                            (list(menu_ids), role_id),
+                            prepare=True
                         )
-                    conn.commit()
-                    return True
+                return (await found.fetchone())["found"]
         except Exception as e:
             logger.error(f"Error assigning menus: {e}")
             return False
     
     @staticmethod
-    def get_by_id(role_id: UUID) -> Optional[dict]:
-        """Get role by ID."""
+    async def get_by_id(role_id: UUID) -> Optional[dict]:
+        """Get role by ID (served from a short-lived cache between writes)."""
+        cached = _role_cache.get(role_id)
+        if cached is not None:
+            return cached
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         "SELECT * FROM roles WHERE id = %s",
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    return cursor.fetchone()
+                    role = await cursor.fetchone()
+                    if role is not None:
+                        _role_cache[role_id] = role
+                    return role
         except Exception as e:
             logger.error(f"Error getting role by ID: {e}")
             return None
     
     @staticmethod
-    def list_roles(
+    async def code_exists(code: str) -> bool:
+        """Check whether a role with the given code exists."""
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT EXISTS (SELECT 1 FROM roles WHERE code = %s) AS found",
+                        (code,),
+                        prepare=True
+                    )
+                    return (await cursor.fetchone())["found"]
+        except Exception as e:
+            logger.error(f"Error checking role code: {e}")
+            return False
+    
+    @staticmethod
+    async def list_roles(
         limit: int = 50,
         offset: int = 0,
         organization_id: Optional[UUID] = None,
         is_active: Optional[bool] = None,
         include_system: bool = False,
-    ) -> List[dict]:
-        """List roles with filters."""
+        after_sort_order: Optional[int] = None,
+        after_name: Optional[str] = None,
+        after_id: Optional[UUID] = None,
+    ) -> Tuple[List[dict], int]:
+        """List roles with filters, returning the page and the total match count.
+
+        When ``after_sort_order``, ``after_name`` and ``after_id`` (the last row of
+        the previous page) are given, the page starts right after that row and ``offset`` is
+        ignored, so the scan walks roles_listing_idx instead of skipping rows.
+        The total always counts every role matching the filters, in both modes.
+        Served from a short-lived cache between writes. Database errors are
+        logged and re-raised rather than reported as an empty page.
+        """
+        key = (limit, offset, organization_id, is_active, include_system, after_sort_order, after_name, after_id)
+        cached = _list_cache.get(key)
+        if cached is not None:
+            return cached
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
                     conditions = []
                     params = []
                     
@@ -244,36 +315,65 @@ class RoleAdminDB:
                         conditions.append("is_system = false")
                     if organization_id:
                         conditions.append("organization_id = %s")
-                        params.append(str(organization_id))
+                        params.append(organization_id)
                     if is_active is not None:
                         conditions.append("is_active = %s")
                         params.append(is_active)
                     
+                    # The total counts the filter matches only, without the keyset predicate
+                    filter_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+                    filter_params = list(params)
+                    
+                    # id breaks ties, since neither sort_order nor name is unique
+                    keyset = after_sort_order is not None and after_name is not None and after_id is not None
+                    if keyset:
+                        conditions.append("(sort_order, name, id) > (%s, %s, %s)")
+                        params.extend([after_sort_order, after_name, after_id])
+                    
                     where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
                     
-                    params.extend([limit, offset])
+                    params.append(limit)
+                    if not keyset:
+                        params.append(offset)
                     
-                    cursor.execute(
+                    # Only a handful of filter combinations exist, so each text is prepared once
+                    await cursor.execute(
                         f"""
-                        SELECT * FROM roles
+                        SELECT *{"" if keyset else ", COUNT(*) OVER() AS total"} FROM roles
                         {where_clause}
-                        ORDER BY sort_order, name
-                        LIMIT %s OFFSET %s
+                        ORDER BY sort_order, name, id
+                        LIMIT %s {"" if keyset else "OFFSET %s"}
                         """,
-                        params
+                        params,
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    roles = await cursor.fetchall()
+                    # On an OFFSET page the window count is the same on every row. A keyset
+                    # page, or an OFFSET page past the end, counts the matches separately
+                    if roles and not keyset:
+                        total = roles[0]["total"]
+                    elif keyset or offset:
+                        await cursor.execute(
+                            f"SELECT COUNT(*) AS total FROM roles {filter_clause}",
+                            filter_params,
+                            prepare=True
+                        )
+                        total = (await cursor.fetchone())["total"]
+                    else:
+                        total = 0
+                    _list_cache[key] = (roles, total)
+                    return roles, total
         except Exception as e:
             logger.error(f"Error listing roles: {e}")
-            return []
+            raise
     
     @staticmethod
-    def get_role_permissions(role_id: UUID) -> List[dict]:
+    async def get_role_permissions(role_id: UUID) -> List[dict]:
         """Get permissions assigned to a role."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT p.*
                         FROM permissions p
@@ -281,30 +381,32 @@ class RoleAdminDB:
                         WHERE rp.role_id = %s
                         ORDER BY p.code
                         """,
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting role permissions: {e}")
             return []
     
     @staticmethod
-    def get_role_menus(role_id: UUID) -> List[dict]:
+    async def get_role_menus(role_id: UUID) -> List[dict]:
         """Get menus assigned to a role."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT m.*
                         FROM menus m
                         INNER JOIN role_menus rm ON m.id = rm.menu_id
                         WHERE rm.role_id = %s
-                        ORDER BY m.sort_order
+                        ORDER BY m.sort_order, m.name
                         """,
-                        (str(role_id),)
+                        (role_id,),
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting role menus: {e}")
             return []
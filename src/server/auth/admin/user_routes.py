@@ -5,151 +5,141 @@
 User management API routes.
 """
 
+import base64
 import logging
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from pydantic import BaseModel
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from pydantic import BaseModel, TypeAdapter
 
-from ..dependencies import CurrentUser, require_admin, require_permission
+from ..dependencies import CurrentUser, invalidate_user, require_admin, require_permission
 from ..models import UserCreate, UserResponse, UserUpdate, UserWithRoles
 
 
 class ChangePasswordRequest(BaseModel):
     """Change password request model."""
     new_password: str
+from ._responses import ORJSONResponse
 from .users import UserAdminDB
-from ..db import UserDB
 
 logger = logging.getLogger(__name__)
 
-router = APIRouter(prefix="/api/admin/users", tags=["admin", "users"])
+router = APIRouter(
+    prefix="/api/admin/users",
+    tags=["admin", "users"],
+    default_response_class=ORJSONResponse,
+)
 
+# Shared dependency markers, one per permission, reused by every route below
+_REQUIRE_USER_READ = Depends(require_permission("user:read"))
+_REQUIRE_USER_CREATE = Depends(require_permission("user:create"))
+_REQUIRE_USER_UPDATE = Depends(require_permission("user:update"))
+_REQUIRE_USER_DELETE = Depends(require_permission("user:delete"))
 
-@router.get("", response_model=List[UserResponse])
+# Validates a whole page of user rows in one pydantic-core call
+_user_list_adapter = TypeAdapter(List[UserWithRoles])
+
+
+def _encode_cursor(user: dict) -> str:
+    """Encode a user row's (created_at, id) sort key as an opaque page cursor."""
+    raw = f"{user['created_at'].isoformat()}|{user['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_cursor(cursor: str) -> Tuple[datetime, UUID]:
+    """Decode a page cursor produced by ``_encode_cursor``."""
+    try:
+        created_at, user_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), UUID(user_id)
+    except ValueError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor",
+        )
+
+
+@router.get("", responses={200: {"model": List[UserWithRoles]}})
 async def list_users(
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
+    cursor: Optional[str] = Query(None),
     organization_id: Optional[UUID] = Query(None),
     department_id: Optional[UUID] = Query(None),
     is_active: Optional[bool] = Query(None),
-    current_user: CurrentUser = Depends(require_permission("user:read")),
+    include_roles: bool = Query(False),
+    current_user: CurrentUser = _REQUIRE_USER_READ,
 ):
-    """List users with filters."""
-    users = UserAdminDB.list_users(
+    """List users with filters, newest first.
+
+    A full page carries an ``X-Next-Cursor`` header; pass it back as ``cursor``
+    to fetch the next page without OFFSET. With ``include_roles`` each user
+    carries its roles as in ``GET /{user_id}``; otherwise ``roles`` is null.
+    """
+    after_created_at, after_id = _decode_cursor(cursor) if cursor else (None, None)
+    users = await UserAdminDB.list_users(
         limit=limit,
         offset=offset,
         organization_id=organization_id,
         department_id=department_id,
         is_active=is_active,
+        after_created_at=after_created_at,
+        after_id=after_id,
+        include_roles=include_roles,
     )
+    headers = {"X-Next-Cursor": _encode_cursor(users[-1])} if len(users) == limit else None
     
-    return [
-        UserResponse(
-            id=user["id"] if isinstance(user["id"], UUID) else UUID(str(user["id"])),
-            username=user["username"],
-            email=user["email"],
-            real_name=user.get("real_name"),
-            phone=user.get("phone"),
-            organization_id=(
-                user["organization_id"]
-                if isinstance(user.get("organization_id"), UUID)
-                else (UUID(str(user["organization_id"])) if user.get("organization_id") else None)
-            ),
-            department_id=(
-                user["department_id"]
-                if isinstance(user.get("department_id"), UUID)
-                else (UUID(str(user["department_id"])) if user.get("department_id") else None)
-            ),
-            is_superuser=user.get("is_superuser", False),
-            is_active=user.get("is_active", True),
-            data_permission_level=user.get("data_permission_level", "self"),
-            last_login_at=user.get("last_login_at").isoformat() if user.get("last_login_at") else None,
-            created_at=user.get("created_at").isoformat() if user.get("created_at") else None,
-            updated_at=user.get("updated_at").isoformat() if user.get("updated_at") else None,
-        )
-        for user in users
-    ]
+    # Validated and serialized once here; no response_model, so FastAPI does not repeat it
+    page = _user_list_adapter.validate_python(users)
+    return Response(
+        content=_user_list_adapter.dump_json(page),
+        media_type="application/json",
+        headers=headers,
+    )
+
+
+@router.get("/count")
+async def count_users(
+    organization_id: Optional[UUID] = Query(None),
+    department_id: Optional[UUID] = Query(None),
+    is_active: Optional[bool] = Query(None),
+    current_user: CurrentUser = _REQUIRE_USER_READ,
+):
+    """Count users matching the list filters; large counts are planner estimates."""
+    total, estimated = await UserAdminDB.count_users(
+        organization_id=organization_id,
+        department_id=department_id,
+        is_active=is_active,
+    )
+    return {"total": total, "estimated": estimated}
 
 
 @router.get("/{user_id}", response_model=UserWithRoles)
 async def get_user(
     user_id: UUID,
-    current_user: CurrentUser = Depends(require_permission("user:read")),
+    current_user: CurrentUser = _REQUIRE_USER_READ,
 ):
     """Get user by ID."""
-    user_data = UserDB.get_by_id(user_id)
+    # The user row and its roles come back from a single query
+    user_data = await UserAdminDB.get_with_roles(user_id)
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     
-    roles = UserDB.get_user_roles(user_id)
-    
-    from ..models import RoleResponse
-    
-    return UserWithRoles(
-        id=user_data["id"] if isinstance(user_data["id"], UUID) else UUID(str(user_data["id"])),
-        username=user_data["username"],
-        email=user_data["email"],
-        real_name=user_data.get("real_name"),
-        phone=user_data.get("phone"),
-        organization_id=(
-            user_data["organization_id"]
-            if isinstance(user_data.get("organization_id"), UUID)
-            else (UUID(str(user_data["organization_id"])) if user_data.get("organization_id") else None)
-        ),
-        department_id=(
-            user_data["department_id"]
-            if isinstance(user_data.get("department_id"), UUID)
-            else (UUID(str(user_data["department_id"])) if user_data.get("department_id") else None)
-        ),
-        is_superuser=user_data.get("is_superuser", False),
-        is_active=user_data.get("is_active", True),
-        data_permission_level=user_data.get("data_permission_level", "self"),
-        last_login_at=user_data.get("last_login_at").isoformat() if user_data.get("last_login_at") else None,
-        created_at=user_data.get("created_at").isoformat() if user_data.get("created_at") else None,
-        updated_at=user_data.get("updated_at").isoformat() if user_data.get("updated_at") else None,
-        roles=[
-            RoleResponse(
-                id=role["id"] if isinstance(role["id"], UUID) else UUID(str(role["id"])),
-                code=role["code"],
-                name=role["name"],
-                description=role.get("description"),
-                organization_id=(
-                    role["organization_id"]
-                    if isinstance(role.get("organization_id"), UUID)
-                    else (UUID(str(role["organization_id"])) if role.get("organization_id") else None)
-                ),
-                data_permission_level=role.get("data_permission_level", "self"),
-                is_system=role.get("is_system", False),
-                is_active=role.get("is_active", True),
-                sort_order=role.get("sort_order", 0),
-                created_at=role.get("created_at").isoformat() if role.get("created_at") else None,
-                updated_at=role.get("updated_at").isoformat() if role.get("updated_at") else None,
-            )
-            for role in roles
-        ],
-    )
+    # Roles are JSON-aggregated, so their IDs and timestamps arrive as strings
+    return UserWithRoles.model_validate(user_data)
 
 
 @router.post("", response_model=UserResponse, status_code=status.HTTP_201_CREATED)
 async def create_user(
     user_data: UserCreate,
-    current_user: CurrentUser = Depends(require_permission("user:create")),
+    current_user: CurrentUser = _REQUIRE_USER_CREATE,
 ):
     """Create a new user."""
-    # Check if username already exists
-    existing = UserDB.get_by_username(user_data.username)
-    if existing:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Username already exists",
-        )
-    
-    user_id = UserAdminDB.create_user(
+    created_user = await UserAdminDB.create_user(
         username=user_data.username,
         email=user_data.email,
         password=user_data.password,
@@ -159,68 +149,33 @@ async def create_user(
         department_id=user_data.department_id,
         is_active=user_data.is_active,
         data_permission_level="self",  # Default permission level
+        role_ids=user_data.role_ids,
     )
     
-    if not user_id:
+    if not created_user:
+        # The insert is skipped on a duplicate; only look the username up on failure
+        if await UserAdminDB.get_by_username(user_data.username):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Username already exists",
+            )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to create user",
         )
     
-    # Assign roles if provided
-    if user_data.role_ids:
-        UserAdminDB.assign_roles(user_id, user_data.role_ids)
-    
-    # Get created user
-    created_user = UserDB.get_by_id(user_id)
-    return UserResponse(
-        id=created_user["id"] if isinstance(created_user["id"], UUID) else UUID(str(created_user["id"])),
-        username=created_user["username"],
-        email=created_user["email"],
-        real_name=created_user.get("real_name"),
-        phone=created_user.get("phone"),
-        organization_id=(
-            created_user["organization_id"]
-            if isinstance(created_user.get("organization_id"), UUID)
-            else (UUID(str(created_user["organization_id"])) if created_user.get("organization_id") else None)
-        ),
-        department_id=(
-            created_user["department_id"]
-            if isinstance(created_user.get("department_id"), UUID)
-            else (UUID(str(created_user["department_id"])) if created_user.get("department_id") else None)
-        ),
-        is_superuser=created_user.get("is_superuser", False),
-        is_active=created_user.get("is_active", True),
-        data_permission_level=created_user.get("data_permission_level", "self"),
-        last_login_at=created_user.get("last_login_at").isoformat() if created_user.get("last_login_at") else None,
-        created_at=created_user.get("created_at").isoformat() if created_user.get("created_at") else None,
-        updated_at=created_user.get("updated_at").isoformat() if created_user.get("updated_at") else None,
-    )
+    return UserResponse.model_validate(created_user)
 
 
 @router.put("/{user_id}", response_model=UserResponse)
 async def update_user(
     user_id: UUID,
     user_data: UserUpdate,
-    current_user: CurrentUser = Depends(require_permission("user:update")),
+    current_user: CurrentUser = _REQUIRE_USER_UPDATE,
 ):
     """Update user information."""
-    # Check if user exists
-    existing = UserDB.get_by_id(user_id)
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    
-    # Prevent updating superuser unless current user is superuser
-    if existing.get("is_superuser") and not current_user.is_superuser:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Cannot update superuser",
-        )
-    
-    success = UserAdminDB.update_user(
+    # The UPDATE skips superusers itself; look the user up only if nothing changed
+    updated_user = await UserAdminDB.update_user(
         user_id=user_id,
         username=user_data.username,
         email=user_data.email,
@@ -230,58 +185,48 @@ async def update_user(
         department_id=user_data.department_id,
         is_active=user_data.is_active,
         data_permission_level=user_data.data_permission_level,
+        allow_superuser=current_user.is_superuser,
     )
     
-    if not success:
+    if not updated_user:
+        existing = await UserAdminDB.get_by_id(user_id)
+        if not existing:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
+        
+        # Prevent updating superuser unless current user is superuser
+        if existing.get("is_superuser") and not current_user.is_superuser:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Cannot update superuser",
+            )
+        
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to update user",
         )
     
-    # Get updated user
-    updated_user = UserDB.get_by_id(user_id)
-    return UserResponse(
-        id=updated_user["id"] if isinstance(updated_user["id"], UUID) else UUID(str(updated_user["id"])),
-        username=updated_user["username"],
-        email=updated_user["email"],
-        real_name=updated_user.get("real_name"),
-        phone=updated_user.get("phone"),
-        organization_id=(
-            updated_user["organization_id"]
-            if isinstance(updated_user.get("organization_id"), UUID)
-            else (UUID(str(updated_user["organization_id"])) if updated_user.get("organization_id") else None)
-        ),
-        department_id=(
-            updated_user["department_id"]
-            if isinstance(updated_user.get("department_id"), UUID)
-            else (UUID(str(updated_user["department_id"])) if updated_user.get("department_id") else None)
-        ),
-        is_superuser=updated_user.get("is_superuser", False),
-        is_active=updated_user.get("is_active", True),
-        data_permission_level=updated_user.get("data_permission_level", "self"),
-        last_login_at=updated_user.get("last_login_at").isoformat() if updated_user.get("last_login_at") else None,
-        created_at=updated_user.get("created_at").isoformat() if updated_user.get("created_at") else None,
-        updated_at=updated_user.get("updated_at").isoformat() if updated_user.get("updated_at") else None,
-    )
+    invalidate_user(user_id)
+    return UserResponse.model_validate(updated_user)
 
 
 @router.post("/{user_id}/change-password")
 async def change_user_password(
     user_id: UUID,
     request: ChangePasswordRequest,
-    current_user: CurrentUser = Depends(require_permission("user:update")),
+    current_user: CurrentUser = _REQUIRE_USER_UPDATE,
 ):
     """Change user password."""
-    # Check if user exists
-    existing = UserDB.get_by_id(user_id)
-    if not existing:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found",
-        )
-    
-    success = UserAdminDB.change_password(user_id, request.new_password)
+    # Write first; look the user up only if no row was updated
+    success = await UserAdminDB.change_password(user_id, request.new_password)
     if not success:
+        if not await UserAdminDB.get_by_id(user_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="User not found",
+            )
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to change password",
@@ -294,36 +239,37 @@ async def change_user_password(
 async def assign_user_roles(
     user_id: UUID,
     role_ids: List[UUID],
-    current_user: CurrentUser = Depends(require_permission("user:update")),
+    current_user: CurrentUser = _REQUIRE_USER_UPDATE,
 ):
     """Assign roles to a user."""
     """Assign roles to a user."""
     # Check if user exists
-    existing = UserDB.get_by_id(user_id)
+    existing = await UserAdminDB.get_by_id(user_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     
-    success = UserAdminDB.assign_roles(user_id, role_ids)
+    success = await UserAdminDB.assign_roles(user_id, role_ids)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to assign roles",
         )
     
+    invalidate_user(user_id)
     return {"message": "Roles assigned successfully"}
 
 
 @router.delete("/{user_id}")
 async def delete_user(
     user_id: UUID,
-    current_user: CurrentUser = Depends(require_permission("user:delete")),
+    current_user: CurrentUser = _REQUIRE_USER_DELETE,
 ):
     """Delete a user (soft delete)."""
     # Check if user exists
-    existing = UserDB.get_by_id(user_id)
+    existing = await UserAdminDB.get_by_id(user_id)
     if not existing:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -337,12 +283,13 @@ async def delete_user(
             detail="Cannot delete superuser",
         )
     
-    success = UserAdminDB.delete_user(user_id)
+    success = await UserAdminDB.delete_user(user_id)
     if not success:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to delete user",
         )
     
+    invalidate_user(user_id)
     return {"message": "User deleted successfully"}
 
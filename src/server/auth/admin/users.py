@@ -5,46 +5,65 @@
 User management database operations.
 """
 
+import asyncio
 import logging
-from typing import List, Optional
+from datetime import datetime
+from typing import List, Optional, Tuple
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
 
-from src.config.loader import get_str_env
 from src.server.auth.password import hash_password
 
-logger = logging.getLogger(__name__)
+from ._db import get_db_connection
 
+logger = logging.getLogger(__name__)
 
-def _as_uuid(value):
-    """Safely convert possible UUID/str/None to UUID or None."""
-    if isinstance(value, UUID):
-        return value
-    return UUID(str(value)) if value is not None else None
+# (organization_id, department_id, is_active) -> (count, estimated)
+_count_cache: TTLCache = TTLCache(maxsize=128, ttl=60)
 
+# Above this many estimated rows an exact COUNT(*) is not worth the scan
+_EXACT_COUNT_LIMIT = 1000
 
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
+# A user's active roles as a JSON array, correlated on the outer ``u`` alias
+_ROLES_JSON_SQL = """
+    COALESCE(
+        (
+            SELECT json_agg(r ORDER BY r.sort_order)
+            FROM roles r
+            INNER JOIN user_roles ur ON r.id = ur.role_id
+            WHERE ur.user_id = u.id AND r.is_active = true
+        ),
+        '[]'
     )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+"""
+
+
+def _user_filters(
+    organization_id: Optional[UUID],
+    department_id: Optional[UUID],
+    is_active: Optional[bool],
+) -> Tuple[List[str], list]:
+    """Build WHERE conditions and params for the user list filters."""
+    conditions = []
+    params = []
+    if organization_id:
+        conditions.append("u.organization_id = %s")
+        params.append(organization_id)
+    if department_id:
+        conditions.append("u.department_id = %s")
+        params.append(department_id)
+    if is_active is not None:
+        conditions.append("u.is_active = %s")
+        params.append(is_active)
+    return conditions, params
 
 
 class UserAdminDB:
     """User management database operations."""
     
     @staticmethod
-    def create_user(
+    async def create_user(
         username: str,
         email: str,
         password: str,
@@ -54,37 +73,54 @@ class UserAdminDB:
         department_id: Optional[UUID] = None,
         is_active: bool = True,
         data_permission_level: str = "self",
-    ) -> Optional[UUID]:
-        """Create a new user."""
+        role_ids: Optional[List[UUID]] = None,
+    ) -> Optional[dict]:
+        """Create a new user and assign its roles in a single statement.
+
+        Returns the new user row, or None if the username (or another unique
+        column) is already taken or the insert failed.
+        """
         try:
-            password_hash = hash_password(password)
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            # bcrypt is deliberately slow; keep it off the event loop
+            password_hash = await asyncio.to_thread(hash_password, password)
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
-                        INSERT INTO users (
-                            username, email, password_hash, real_name, phone,
-                            organization_id, department_id, is_active, data_permission_level
+                        WITH new_user AS (
+                            INSERT INTO users (
+                                username, email, password_hash, real_name, phone,
+                                organization_id, department_id, is_active, data_permission_level
+                            )
+                            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                            ON CONFLICT DO NOTHING
+                            RETURNING *
+                        ),
+                        new_roles AS (
+                            INSERT INTO user_roles (user_id, role_id)
+                            SELECT new_user.id, unnest(%s::uuid[]) FROM new_user
+                            ON CONFLICT DO NOTHING
                         )
-                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        RETURNING id
+                        SELECT * FROM new_user
                         """,
                         (
                             username, email, password_hash, real_name, phone,
-                            str(organization_id) if organization_id else None,
-                            str(department_id) if department_id else None,
-                            is_active, data_permission_level
-                        )
+                            organization_id, department_id,
+                            is_active, data_permission_level,
+                            list(role_ids or []),
+                        ),
+                        prepare=True
                     )
-                    user_id = cursor.fetchone()["id"]
-                    conn.commit()
-                    return _as_uuid(user_id)
+                    user = await cursor.fetchone()
+                    if user:
+                        _count_cache.clear()
+                    return user
         except Exception as e:
             logger.error(f"Error creating user: {e}")
             return None
     
     @staticmethod
-    def update_user(
+    async def update_user(
         user_id: UUID,
         username: Optional[str] = None,
         email: Optional[str] = None,
@@ -94,172 +130,293 @@ class UserAdminDB:
         department_id: Optional[UUID] = None,
         is_active: Optional[bool] = None,
         data_permission_level: Optional[str] = None,
-    ) -> bool:
-        """Update user information."""
+        allow_superuser: bool = False,
+    ) -> Optional[dict]:
+        """Update user information and return the updated row.
+
+        Fields left as ``None`` keep their current value. Superusers are only
+        updated when ``allow_superuser`` is set. Returns None if the user does
+        not exist, is a protected superuser, or the update failed.
+        """
         try:
-            updates = []
-            values = []
-            
-            if username is not None:
-                updates.append("username = %s")
-                values.append(username)
-            if email is not None:
-                updates.append("email = %s")
-                values.append(email)
-            if real_name is not None:
-                updates.append("real_name = %s")
-                values.append(real_name)
-            if phone is not None:
-                updates.append("phone = %s")
-                values.append(phone)
-            if organization_id is not None:
-                updates.append("organization_id = %s")
-                values.append(str(organization_id))
-            if department_id is not None:
-                updates.append("department_id = %s")
-                values.append(str(department_id))
-            if is_active is not None:
-                updates.append("is_active = %s")
-                values.append(is_active)
-            if data_permission_level is not None:
-                updates.append("data_permission_level = %s")
-                values.append(data_permission_level)
-            
-            if not updates:
-                return True
-            
-            updates.append("updated_at = NOW()")
-            values.append(str(user_id))
-            
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        f"""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # One static statement; RETURNING * saves a follow-up read
+                    await cursor.execute(
+                        """
                         UPDATE users
-                        SET {', '.join(updates)}
-                        WHERE id = %s
+                        SET username = COALESCE(%s, username),
+                            email = COALESCE(%s, email),
+                            real_name = COALESCE(%s, real_name),
+                            phone = COALESCE(%s, phone),
+                            organization_id = COALESCE(%s, organization_id),
+                            department_id = COALESCE(%s, department_id),
+                            is_active = COALESCE(%s, is_active),
+                            data_permission_level = COALESCE(%s, data_permission_level),
+                            updated_at = NOW()
+                        WHERE id = %s AND (is_superuser = false OR %s)
+                        RETURNING *
                         """,
-                        values
+                        (
+                            username, email, real_name, phone,
+                            organization_id, department_id, is_active,
+                            data_permission_level, user_id, allow_superuser,
+                        ),
+                        prepare=True
                     )
-                    conn.commit()
-                    return cursor.rowcount > 0
+                    user = await cursor.fetchone()
+                    if organization_id is not None or department_id is not None or is_active is not None:
+                        _count_cache.clear()
+                    return user
         except Exception as e:
             logger.error(f"Error updating user: {e}")
-            return False
+            return None
     
     @staticmethod
-    def change_password(user_id: UUID, new_password: str) -> bool:
+    async def change_password(user_id: UUID, new_password: str) -> bool:
         """Change user password."""
         try:
-            password_hash = hash_password(new_password)
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            password_hash = await asyncio.to_thread(hash_password, new_password)
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         UPDATE users
                         SET password_hash = %s, updated_at = NOW()
                         WHERE id = %s
                         """,
-                        (password_hash, str(user_id))
+                        (password_hash, user_id),
+                        prepare=True
                     )
-                    conn.commit()
                     return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error changing password: {e}")
             return False
     
     @staticmethod
-    def delete_user(user_id: UUID) -> bool:
+    async def delete_user(user_id: UUID) -> bool:
         """Delete a user (soft delete by setting is_active=False)."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         UPDATE users
                         SET is_active = false, updated_at = NOW()
                         WHERE id = %s AND is_superuser = false
                         """,
-                        (str(user_id),)
+                        (user_id,),
+                        prepare=True
                     )
-                    conn.commit()
+                    _count_cache.clear()
                     return cursor.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting user: {e}")
             return False
     
     @staticmethod
-    def assign_roles(user_id: UUID, role_ids: List[UUID]) -> bool:
-        """Assign roles to a user."""
+    async def assign_roles(user_id: UUID, role_ids: List[UUID]) -> bool:
+        """Assign roles to a user.
+
+        Only the difference is written: roles no longer listed are deleted and
+        missing ones inserted, so saving an unchanged set touches no rows.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Remove existing roles
-                    cursor.execute(
-                        "DELETE FROM user_roles WHERE user_id = %s",
-                        (str(user_id),)
-                    )
-                    # Add new roles
-                    if role_ids:
-                        cursor.executemany(
+            async with get_db_connection() as conn:
+                # Multi-statement write; pooled connections are autocommit
+                async with conn.transaction():
+                    async with conn.cursor() as cursor:
+                        # Remove roles that are not in the new set
+                        await cursor.execute(
                             """
-                            INSERT INTO user_roles (user_id, role_id)
-                            VALUES (%s, %s)
-                            ON CONFLICT DO NOTHING
+                            DELETE FROM user_roles
+                            WHERE user_id = %s AND NOT (role_id = ANY(%s::uuid[]))
                             """,
-                            [(str(user_id), str(role_id)) for role_id in role_ids]
+                            (user_id, role_ids),
+                            prepare=True
                         )
-                    conn.commit()
-                    return True
+                        # Add missing roles; rows already present hit ON CONFLICT and are skipped
+                        if role_ids:
+                            await cursor.execute(
+                                """
+                                INSERT INTO user_roles (user_id, role_id)
+                                SELECT %s, unnest(%s::uuid[])
+                                ON CONFLICT DO NOTHING
+                                """,
+                                (user_id, role_ids),
+                                prepare=True
+                            )
+                        return True
         except Exception as e:
             logger.error(f"Error assigning roles: {e}")
             return False
     
     @staticmethod
-    def list_users(
+    async def list_users(
         limit: int = 50,
         offset: int = 0,
         organization_id: Optional[UUID] = None,
         department_id: Optional[UUID] = None,
         is_active: Optional[bool] = None,
+        after_created_at: Optional[datetime] = None,
+        after_id: Optional[UUID] = None,
+        include_roles: bool = False,
     ) -> List[dict]:
-        """List users with filters."""
+        """List users with filters, newest first.
+
+        With ``include_roles`` each row also carries the user's active roles
+        as a JSON array under ``roles``, as returned by ``get_with_roles``.
+
+        When ``after_created_at`` and ``after_id`` (the last row of the previous
+        page) are given, the page starts right after that row and ``offset`` is
+        ignored, so the scan walks users_created_idx (or the organization /
+        department variants when filtered) instead of skipping rows.
+        """
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    conditions = []
-                    params = []
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    conditions, params = _user_filters(organization_id, department_id, is_active)
                     
-                    if organization_id:
-                        conditions.append("u.organization_id = %s")
-                        params.append(str(organization_id))
-                    if department_id:
-                        conditions.append("u.department_id = %s")
-                        params.append(str(department_id))
-                    if is_active is not None:
-                        conditions.append("u.is_active = %s")
-                        params.append(is_active)
+                    keyset = after_created_at is not None and after_id is not None
+                    if keyset:
+                        conditions.append("(u.created_at, u.id) < (%s, %s)")
+                        params.extend([after_created_at, after_id])
                     
                     where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
                     
-                    params.extend([limit, offset])
+                    params.append(limit)
+                    if not keyset:
+                        params.append(offset)
                     
-                    cursor.execute(
+                    await cursor.execute(
                         f"""
                         SELECT u.*, 
                                o.name as organization_name,
                                d.name as department_name
+                               {f", {_ROLES_JSON_SQL} as roles" if include_roles else ""}
                         FROM users u
                         LEFT JOIN organizations o ON u.organization_id = o.id
                         LEFT JOIN departments d ON u.department_id = d.id
                         {where_clause}
-                        ORDER BY u.created_at DESC
-                        LIMIT %s OFFSET %s
+                        ORDER BY u.created_at DESC, u.id DESC
+                        LIMIT %s {"" if keyset else "OFFSET %s"}
                         """,
-                        params
+                        params,
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error listing users: {e}")
             return []
+    
+    @staticmethod
+    async def count_users(
+        organization_id: Optional[UUID] = None,
+        department_id: Optional[UUID] = None,
+        is_active: Optional[bool] = None,
+    ) -> Tuple[int, bool]:
+        """Count users matching the list filters.
+
+        Returns ``(count, estimated)``. The planner's row estimate is used as-is
+        when it exceeds ``_EXACT_COUNT_LIMIT``; smaller sets get an exact
+        COUNT(*). Results are cached for a minute per filter combination.
+        """
+        key = (organization_id, department_id, is_active)
+        cached = _count_cache.get(key)
+        if cached is not None:
+            return cached
+        try:
+            conditions, params = _user_filters(organization_id, department_id, is_active)
+            where_clause = "WHERE " + " AND ".join(conditions) if conditions else ""
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    # The scan node's estimate comes from pg_class.reltuples and column stats
+                    await cursor.execute(
+                        f"EXPLAIN (FORMAT JSON) SELECT 1 FROM users u {where_clause}",
+                        params
+                    )
+                    plan = (await cursor.fetchone())["QUERY PLAN"]
+                    estimate = int(plan[0]["Plan"]["Plan Rows"])
+                    if estimate > _EXACT_COUNT_LIMIT:
+                        result = (estimate, True)
+                    else:
+                        await cursor.execute(
+                            f"SELECT COUNT(*) AS total FROM users u {where_clause}",
+                            params,
+                            prepare=True
+                        )
+                        result = ((await cursor.fetchone())["total"], False)
+            _count_cache[key] = result
+            return result
+        except Exception as e:
+            logger.error(f"Error counting users: {e}")
+            return 0, False
+    
+    @staticmethod
+    async def get_by_id(user_id: UUID) -> Optional[dict]:
+        """Get user by ID, with organization and department names."""
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        """
+                        SELECT u.*, 
+                               o.name as organization_name,
+                               d.name as department_name
+                        FROM users u
+                        LEFT JOIN organizations o ON u.organization_id = o.id
+                        LEFT JOIN departments d ON u.department_id = d.id
+                        WHERE u.id = %s
+                        """,
+                        (user_id,),
+                        prepare=True
+                    )
+                    return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting user by ID: {e}")
+            return None
+    
+    @staticmethod
+    async def get_with_roles(user_id: UUID) -> Optional[dict]:
+        """Get user by ID together with the user's active roles in one query.
 
+        Roles are aggregated as JSON under ``roles``, so their IDs and
+        timestamps arrive as strings.
+        """
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        f"""
+                        SELECT u.*, 
+                               o.name as organization_name,
+                               d.name as department_name,
+                               {_ROLES_JSON_SQL} as roles
+                        FROM users u
+                        LEFT JOIN organizations o ON u.organization_id = o.id
+                        LEFT JOIN departments d ON u.department_id = d.id
+                        WHERE u.id = %s
+                        """,
+                        (user_id,),
+                        prepare=True
+                    )
+                    return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting user with roles: {e}")
+            return None
+    
+    @staticmethod
+    async def get_by_username(username: str) -> Optional[dict]:
+        """Get user by username."""
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "SELECT * FROM users WHERE username = %s",
+                        (username,),
+                        prepare=True
+                    )
+                    return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting user by username: {e}")
+            return None
@@ -11,6 +11,7 @@ and private key decryption on the server side.
 import base64
 import logging
 import os
+import threading
 from pathlib import Path
 from typing import Optional
 
@@ -36,6 +37,14 @@ PUBLIC_KEY_PATH = KEYS_DIR / "rsa_public_key.pem"
 # RSA key size (2048 bits is secure and widely supported)
 RSA_KEY_SIZE = 2048
 
+# Key pair loaded once per process; the PEM files do not change while running
+_key_pair: Optional[tuple[str, str]] = None
+_key_pair_lock = threading.Lock()
+
+# RSA-OAEP cipher built from the private key on first decrypt
+_decrypt_cipher = None
+_decrypt_cipher_lock = threading.Lock()
+
 
 def ensure_keys_dir():
     """Ensure the keys directory exists."""
@@ -115,6 +124,33 @@ def load_or_generate_key_pair() -> tuple[str, str]:
     return private_key_pem, public_key_pem
 
 
+def get_key_pair() -> tuple[str, str]:
+    """
+    Get the process-wide RSA key pair, loading or generating it on first use.
+    
+    Returns:
+        tuple: (private_key_pem, public_key_pem) as strings
+    """
+    global _key_pair
+    if _key_pair is None:
+        with _key_pair_lock:
+            if _key_pair is None:
+                _key_pair = load_or_generate_key_pair()
+    return _key_pair
+
+
+def _get_decrypt_cipher():
+    """Get the cached RSA-OAEP cipher for the private key."""
+    global _decrypt_cipher
+    if _decrypt_cipher is None:
+        with _decrypt_cipher_lock:
+            if _decrypt_cipher is None:
+                private_key_pem, _ = get_key_pair()
+                # Use PKCS1_OAEP (RSA-OAEP) to match Web Crypto API
+                _decrypt_cipher = PKCS1_OAEP.new(RSA.import_key(private_key_pem), hashAlgo=SHA256)
+    return _decrypt_cipher
+
+
 def get_public_key() -> str:
     """
     Get the RSA public key (for client-side encryption).
@@ -129,7 +165,7 @@ def get_public_key() -> str:
         raise RuntimeError(
             "pycryptodome is not installed. Please install it: pip install pycryptodome"
         )
-    _, public_key_pem = load_or_generate_key_pair()
+    _, public_key_pem = get_key_pair()
     return public_key_pem
 
 
@@ -151,10 +187,7 @@ def decrypt_password(encrypted_password_b64: str) -> Optional[str]:
             "pycryptodome is not installed. Please install it: pip install pycryptodome"
         )
     try:
-        private_key_pem, _ = load_or_generate_key_pair()
-        private_key = RSA.import_key(private_key_pem)
-        # Use PKCS1_OAEP (RSA-OAEP) to match Web Crypto API
-        cipher = PKCS1_OAEP.new(private_key, hashAlgo=SHA256)
+        cipher = _get_decrypt_cipher()
         
         # Decode from base64
         encrypted_bytes = base64.b64decode(encrypted_password_b64)
@@ -6,45 +6,49 @@ Database utilities for RBAC system.
 Provides functions to interact with PostgreSQL database directly.
 """
 
+import asyncio
 import logging
-from typing import List, Optional
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 from uuid import UUID
 
-import psycopg
-from psycopg.rows import dict_row
+from cachetools import TTLCache
+from psycopg.rows import tuple_row
 
-from src.config.loader import get_str_env
+# One pool per process: auth queries borrow the admin pool's autocommit
+# connections, and every statement here is static text, so it is prepared
+from .admin._db import get_db_connection
 
 logger = logging.getLogger(__name__)
 
+# Columns read from a user row; password_hash is only loaded for login
+_USER_COLUMNS = """
+    u.id, u.username, u.email, u.real_name, u.phone, u.is_superuser, u.is_active,
+    u.organization_id, u.department_id, u.data_permission_level,
+    u.last_login_at, u.created_at, u.updated_at
+"""
 
-def get_db_connection():
-    """Get database connection."""
-    db_url = (
-        get_str_env("DATABASE_URL") or
-        get_str_env("SQLALCHEMY_DATABASE_URI") or
-        get_str_env("LANGGRAPH_CHECKPOINT_DB_URL", "postgresql://localhost:5432/agenticworkflow")
-    )
-    
-    # Ensure postgresql:// format
-    if db_url.startswith("postgresql://"):
-        db_url = db_url.replace("postgresql://", "postgres://", 1)
-    
-    return psycopg.connect(db_url, row_factory=dict_row)
+# JTIs recently confirmed NOT blacklisted; revoked tokens are never cached
+_not_blacklisted: TTLCache = TTLCache(maxsize=20000, ttl=5)
+
+# Pending last_login_at writes, flushed in one UPDATE by _flush_login_loop
+_LOGIN_FLUSH_INTERVAL = 2.0
+_login_buf: Dict[UUID, datetime] = {}
+_login_flush_task: Optional[asyncio.Task] = None
 
 
 class UserDB:
     """User database operations."""
     
     @staticmethod
-    def get_by_username(username: str) -> Optional[dict]:
+    async def get_by_username(username: str) -> Optional[dict]:
         """Get user by username."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT u.*, 
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        f"""
+                        SELECT {_USER_COLUMNS}, u.password_hash,
                                o.name as organization_name,
                                d.name as department_name
                         FROM users u
@@ -52,22 +56,23 @@ class UserDB:
                         LEFT JOIN departments d ON u.department_id = d.id
                         WHERE u.username = %s
                         """,
-                        (username,)
+                        (username,),
+                        prepare=True
                     )
-                    return cursor.fetchone()
+                    return await cursor.fetchone()
         except Exception as e:
             logger.error(f"Error getting user by username: {e}")
             return None
     
     @staticmethod
-    def get_by_id(user_id: UUID) -> Optional[dict]:
+    async def get_by_id(user_id: UUID) -> Optional[dict]:
         """Get user by ID."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        """
-                        SELECT u.*, 
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        f"""
+                        SELECT {_USER_COLUMNS},
                                o.name as organization_name,
                                d.name as department_name
                         FROM users u
@@ -75,20 +80,66 @@ class UserDB:
                         LEFT JOIN departments d ON u.department_id = d.id
                         WHERE u.id = %s
                         """,
-                        (str(user_id),)
+                        (user_id,),
+                        prepare=True
                     )
-                    return cursor.fetchone()
+                    return await cursor.fetchone()
         except Exception as e:
             logger.error(f"Error getting user by ID: {e}")
             return None
     
     @staticmethod
-    def get_user_roles(user_id: UUID) -> List[dict]:
+    async def get_auth_context(user_id: UUID) -> Optional[dict]:
+        """Get user by ID together with its active roles and permission codes.
+
+        Roles are aggregated as JSON under ``roles`` and permission codes as a
+        sorted array under ``permissions``, so authentication needs one query.
+        """
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        f"""
+                        SELECT {_USER_COLUMNS},
+                               o.name as organization_name,
+                               d.name as department_name,
+                               COALESCE(
+                                   (
+                                       SELECT json_agg(r ORDER BY r.sort_order)
+                                       FROM roles r
+                                       INNER JOIN user_roles ur ON r.id = ur.role_id
+                                       WHERE ur.user_id = u.id AND r.is_active = true
+                                   ),
+                                   '[]'
+                               ) as roles,
+                               ARRAY(
+                                   SELECT DISTINCT p.code
+                                   FROM permissions p
+                                   INNER JOIN role_permissions rp ON p.id = rp.permission_id
+                                   INNER JOIN user_roles ur ON rp.role_id = ur.role_id
+                                   WHERE ur.user_id = u.id
+                                   ORDER BY p.code
+                               ) as permissions
+                        FROM users u
+                        LEFT JOIN organizations o ON u.organization_id = o.id
+                        LEFT JOIN departments d ON u.department_id = d.id
+                        WHERE u.id = %s
+                        """,
+                        (user_id,),
+                        prepare=True
+                    )
+                    return await cursor.fetchone()
+        except Exception as e:
+            logger.error(f"Error getting user auth context: {e}")
+            return None
+    
+    @staticmethod
+    async def get_user_roles(user_id: UUID) -> List[dict]:
         """Get user's roles."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT r.*
                         FROM roles r
@@ -96,167 +147,217 @@ class UserDB:
                         WHERE ur.user_id = %s AND r.is_active = true
                         ORDER BY r.sort_order
                         """,
-                        (str(user_id),)
+                        (user_id,),
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting user roles: {e}")
             return []
     
     @staticmethod
-    def get_user_permissions(user_id: UUID) -> List[str]:
+    async def get_user_permissions(user_id: UUID) -> List[str]:
         """Get user's permission codes."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # Get permissions from user's roles
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor(row_factory=tuple_row) as cursor:
+                    # Get permissions from user's roles as a single text[] value
+                    await cursor.execute(
                         """
-                        SELECT DISTINCT p.code
-                        FROM permissions p
-                        INNER JOIN role_permissions rp ON p.id = rp.permission_id
-                        INNER JOIN user_roles ur ON rp.role_id = ur.role_id
-                        WHERE ur.user_id = %s
-                        ORDER BY p.code
+                        SELECT ARRAY(
+                            SELECT DISTINCT p.code
+                            FROM permissions p
+                            INNER JOIN role_permissions rp ON p.id = rp.permission_id
+                            INNER JOIN user_roles ur ON rp.role_id = ur.role_id
+                            WHERE ur.user_id = %s
+                            ORDER BY p.code
+                        )
                         """,
-                        (str(user_id),)
+                        (user_id,),
+                        prepare=True
                     )
-                    return [row["code"] for row in cursor.fetchall()]
+                    row = await cursor.fetchone()
+                    return row[0] or []
         except Exception as e:
             logger.error(f"Error getting user permissions: {e}")
             return []
     
     @staticmethod
-    def get_user_menus(user_id: UUID) -> List[dict]:
-        """Get user's accessible menus (tree structure)."""
-        try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    # 首先判断是否为超级管理员；超级管理员默认拥有所有可见菜单
-                    cursor.execute(
-                        "SELECT is_superuser FROM users WHERE id = %s",
-                        (str(user_id),),
-                    )
-                    row = cursor.fetchone()
-                    is_superuser = bool(row and row.get("is_superuser"))
+    async def get_user_menus(user_id: UUID, is_superuser: bool = False) -> List[dict]:
+        """Get user's accessible menus (flat rows, ordered by sort_order).
 
+        Superusers see every visible menu. Other users see the visible menus of
+        their roles plus every ancestor of those, so the tree can be rebuilt.
+        """
+        try:
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
                     if is_superuser:
                         # 超级管理员：直接返回所有 is_visible = true 的菜单
-                        cursor.execute(
+                        await cursor.execute(
                             """
                             SELECT *
                             FROM menus
                             WHERE is_visible = true
                             ORDER BY sort_order
-                            """
+                            """,
+                            prepare=True
                         )
-                        return cursor.fetchall()
+                        return await cursor.fetchall()
 
-                    # 普通用户：根据角色关联的菜单来计算可访问菜单
-                    # Get menu IDs from user's roles
-                    cursor.execute(
+                    # 普通用户：根据角色关联的菜单及其所有上级菜单计算可访问菜单；
+                    # 只在 id 上递归，UNION 去重，一条语句完成
+                    await cursor.execute(
                         """
-                        SELECT DISTINCT m.id
-                        FROM menus m
-                        INNER JOIN role_menus rm ON m.id = rm.menu_id
-                        INNER JOIN user_roles ur ON rm.role_id = ur.role_id
-                        WHERE ur.user_id = %s AND m.is_visible = true
-                        """,
-                        (str(user_id),)
-                    )
-                    menu_ids = [row["id"] for row in cursor.fetchall()]
-                    
-                    if not menu_ids:
-                        return []
-                    
-                    # Get all menus (including parents for tree structure)
-                    cursor.execute(
-                        """
-                        WITH RECURSIVE menu_tree AS (
-                            SELECT m.*, 0 as level
+                        WITH RECURSIVE menu_ids AS (
+                            SELECT m.id, m.parent_id
                             FROM menus m
-                            WHERE m.id = ANY(%s::uuid[])
+                            INNER JOIN role_menus rm ON m.id = rm.menu_id
+                            INNER JOIN user_roles ur ON rm.role_id = ur.role_id
+                            WHERE ur.user_id = %s AND m.is_visible = true
                             
-                            UNION ALL
+                            UNION
                             
-                            SELECT m.*, mt.level + 1
+                            SELECT m.id, m.parent_id
                             FROM menus m
-                            INNER JOIN menu_tree mt ON m.id = mt.parent_id
+                            INNER JOIN menu_ids mi ON m.id = mi.parent_id
                         )
-                        SELECT DISTINCT * FROM menu_tree
-                        ORDER BY sort_order, level
+                        SELECT m.*
+                        FROM menus m
+                        WHERE m.id IN (SELECT id FROM menu_ids)
+                        ORDER BY m.sort_order
                         """,
-                        (menu_ids,)
+                        (user_id,),
+                        prepare=True
                     )
-                    return cursor.fetchall()
+                    return await cursor.fetchall()
         except Exception as e:
             logger.error(f"Error getting user menus: {e}")
             return []
     
     @staticmethod
-    def update_last_login(user_id: UUID):
-        """Update user's last login time."""
+    async def update_last_login(user_id: UUID):
+        """Record user's last login time.
+
+        Buffered for the login flush loop while it runs; without it (scripts,
+        a failed startup) the time is written straight away.
+        """
+        _login_buf[user_id] = datetime.now(timezone.utc)
+        if _login_flush_task is None or _login_flush_task.done():
+            await flush_last_logins()
+
+
+async def flush_last_logins() -> None:
+    """Write all buffered last_login_at values in a single UPDATE."""
+    global _login_buf
+    if not _login_buf:
+        return
+    pending, _login_buf = _login_buf, {}
+    try:
+        async with get_db_connection() as conn:
+            await conn.execute(
+                """
+                UPDATE users u
+                SET last_login_at = v.ts
+                FROM unnest(%s::uuid[], %s::timestamptz[]) AS v(id, ts)
+                WHERE u.id = v.id
+                """,
+                (list(pending.keys()), list(pending.values())),
+                prepare=True
+            )
+    except Exception as e:
+        logger.error(f"Error updating last login: {e}")
+        # Keep the entries for the next flush unless a newer login replaced them
+        for user_id, ts in pending.items():
+            _login_buf.setdefault(user_id, ts)
+
+
+async def _flush_login_loop() -> None:
+    while True:
+        await asyncio.sleep(_LOGIN_FLUSH_INTERVAL)
+        await flush_last_logins()
+
+
+def start_login_flusher() -> None:
+    """Start the background task that flushes buffered last_login_at writes."""
+    global _login_flush_task
+    if _login_flush_task is None or _login_flush_task.done():
+        _login_flush_task = asyncio.create_task(_flush_login_loop())
+
+
+async def stop_login_flusher() -> None:
+    """Stop the flush task and write whatever is still buffered."""
+    global _login_flush_task
+    if _login_flush_task is not None:
+        _login_flush_task.cancel()
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE users SET last_login_at = NOW() WHERE id = %s",
-                        (str(user_id),)
-                    )
-                    conn.commit()
-        except Exception as e:
-            logger.error(f"Error updating last login: {e}")
+            await _login_flush_task
+        except asyncio.CancelledError:
+            pass
+        _login_flush_task = None
+    await flush_last_logins()
 
 
 class TokenBlacklist:
     """Token blacklist management."""
     
     @staticmethod
-    def add_token(token_jti: str, user_id: UUID, expires_at):
+    async def add_token(token_jti: str, user_id: UUID, expires_at):
         """Add token to blacklist."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         INSERT INTO user_sessions (user_id, token_jti, expires_at)
                         VALUES (%s, %s, %s)
                         ON CONFLICT (token_jti) DO NOTHING
                         """,
-                        (str(user_id), token_jti, expires_at)
+                        (user_id, token_jti, expires_at),
+                        prepare=True
                     )
-                    conn.commit()
+            _not_blacklisted.pop(token_jti, None)
         except Exception as e:
             logger.error(f"Error adding token to blacklist: {e}")
     
     @staticmethod
-    def is_blacklisted(token_jti: str) -> bool:
-        """Check if token is blacklisted."""
+    async def is_blacklisted(token_jti: str) -> bool:
+        """Check if token is blacklisted.
+
+        Negative answers are cached for a few seconds, so most requests skip
+        the query; add_token drops the cached answer for the revoked JTI.
+        """
+        if token_jti in _not_blacklisted:
+            return False
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
                         """
                         SELECT 1 FROM user_sessions
                         WHERE token_jti = %s AND expires_at > NOW()
                         """,
-                        (token_jti,)
+                        (token_jti,),
+                        prepare=True
                     )
-                    return cursor.fetchone() is not None
+                    blacklisted = await cursor.fetchone() is not None
+            if not blacklisted:
+                _not_blacklisted[token_jti] = True
+            return blacklisted
         except Exception as e:
             logger.error(f"Error checking token blacklist: {e}")
             return False
     
     @staticmethod
-    def cleanup_expired():
+    async def cleanup_expired():
         """Clean up expired tokens."""
         try:
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "DELETE FROM user_sessions WHERE expires_at < NOW()"
+            async with get_db_connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(
+                        "DELETE FROM user_sessions WHERE expires_at < NOW()",
+                        prepare=True
                     )
-                    conn.commit()
         except Exception as e:
             logger.error(f"Error cleaning up expired tokens: {e}")
 
@@ -5,20 +5,54 @@
 FastAPI dependencies for authentication and authorization.
 """
 
+import asyncio
 import logging
+from functools import lru_cache
 from typing import Optional
 from uuid import UUID
 
+from cachetools import TTLCache
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
+from src.config.loader import get_int_env
+
 from .db import TokenBlacklist, UserDB
-from .jwt import decode_token, get_token_jti
+from .jwt import decode_token
 
 logger = logging.getLogger(__name__)
 
 security = HTTPBearer()
 
+# user_id -> auth context row (user, roles, permissions); bounded staleness
+_auth_context_cache: TTLCache = TTLCache(maxsize=10000, ttl=get_int_env("AUTH_CACHE_TTL", 60))
+
+
+async def _get_auth_context(user_id: UUID) -> Optional[dict]:
+    """Get a user's auth context, served from the TTL cache when possible."""
+    user_data = _auth_context_cache.get(user_id)
+    if user_data is None:
+        user_data = await UserDB.get_auth_context(user_id)
+        if user_data is not None:
+            _auth_context_cache[user_id] = user_data
+    return user_data
+
+
+async def _is_revoked(token_jti: Optional[str]) -> bool:
+    """Check whether a token's JTI has been blacklisted (tokens without one never are)."""
+    return bool(token_jti) and await TokenBlacklist.is_blacklisted(token_jti)
+
+
+def invalidate_user(user_id: Optional[UUID] = None) -> None:
+    """Drop cached auth context for one user, or for everyone if no ID is given.
+
+    Call after changing a user's roles or status, or a role's permissions.
+    """
+    if user_id is None:
+        _auth_context_cache.clear()
+    else:
+        _auth_context_cache.pop(user_id, None)
+
 
 class CurrentUser:
     """Current user object with permissions and roles."""
@@ -36,30 +70,33 @@ class CurrentUser:
         self.data_permission_level = user_data.get("data_permission_level", "self")
         self.roles = roles
         self.permissions = permissions
+        # Set views so each permission/role check is a hash lookup, not a list scan
+        self._permission_codes = frozenset(permissions)
+        self._role_codes = frozenset(role["code"] for role in roles)
     
     def has_permission(self, permission_code: str) -> bool:
         """Check if user has a specific permission."""
         if self.is_superuser:
             return True
-        return permission_code in self.permissions
+        return permission_code in self._permission_codes
     
     def has_role(self, role_code: str) -> bool:
         """Check if user has a specific role."""
         if self.is_superuser:
             return True
-        return any(role["code"] == role_code for role in self.roles)
+        return role_code in self._role_codes
     
     def has_any_permission(self, permission_codes: list) -> bool:
         """Check if user has any of the specified permissions."""
         if self.is_superuser:
             return True
-        return any(code in self.permissions for code in permission_codes)
+        return not self._permission_codes.isdisjoint(permission_codes)
     
     def has_any_role(self, role_codes: list) -> bool:
         """Check if user has any of the specified roles."""
         if self.is_superuser:
             return True
-        return any(role["code"] in role_codes for role in self.roles)
+        return not self._role_codes.isdisjoint(role_codes)
 
 
 async def get_current_user(
@@ -88,15 +125,6 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Check token blacklist
-    token_jti = get_token_jti(token)
-    if token_jti and TokenBlacklist.is_blacklisted(token_jti):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token has been revoked",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
     # Get user ID from token
     user_id_str = payload.get("sub")
     if not user_id_str:
@@ -115,8 +143,18 @@ async def get_current_user(
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    # Get user from database
-    user_data = UserDB.get_by_id(user_id)
+    # Check the token blacklist while loading user, roles and permissions
+    revoked, user_data = await asyncio.gather(
+        _is_revoked(payload.get("jti")),
+        _get_auth_context(user_id),
+    )
+    if revoked:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token has been revoked",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -130,17 +168,17 @@ async def get_current_user(
             detail="User account is disabled",
         )
     
-    # Get user roles and permissions
-    roles = UserDB.get_user_roles(user_id)
-    permissions = UserDB.get_user_permissions(user_id)
-    
-    return CurrentUser(user_data, roles, permissions)
+    return CurrentUser(user_data, user_data["roles"], user_data["permissions"])
 
 
+@lru_cache(maxsize=None)
 def require_permission(permission_code: str):
     """
     Dependency factory to require a specific permission.
     
+    The checker is memoized per permission code, so every route requiring the
+    same permission shares one dependency callable.
+    
     Usage:
         @app.get("/api/users")
         async def get_users(
@@ -260,11 +298,6 @@ async def get_current_user_optional(
         if not payload:
             return None
         
-        # Check token blacklist
-        token_jti = get_token_jti(token)
-        if token_jti and TokenBlacklist.is_blacklisted(token_jti):
-            return None
-        
         # Get user ID from token
         user_id_str = payload.get("sub")
         if not user_id_str:
@@ -275,19 +308,18 @@ async def get_current_user_optional(
         except ValueError:
             return None
         
-        # Get user from database
-        user_data = UserDB.get_by_id(user_id)
-        if not user_data:
+        # Check the token blacklist while loading user, roles and permissions
+        revoked, user_data = await asyncio.gather(
+            _is_revoked(payload.get("jti")),
+            _get_auth_context(user_id),
+        )
+        if revoked or not user_data:
             return None
         
         if not user_data.get("is_active", True):
             return None
         
-        # Get user roles and permissions
-        roles = UserDB.get_user_roles(user_id)
-        permissions = UserDB.get_user_permissions(user_id)
-        
-        return CurrentUser(user_data, roles, permissions)
+        return CurrentUser(user_data, user_data["roles"], user_data["permissions"])
     except Exception as e:
         logger.debug(f"Optional authentication failed: {e}")
         return None
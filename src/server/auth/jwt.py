@@ -7,11 +7,13 @@ JWT token generation and verification.
 
 import logging
 import os
+import time
 from datetime import datetime, timedelta
 from typing import Optional
 from uuid import uuid4
 
 import jwt
+from cachetools import TTLCache
 from jwt import PyJWTError
 
 logger = logging.getLogger(__name__)
@@ -21,6 +23,9 @@ SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your-secret-key-change-in-production")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("JWT_ACCESS_TOKEN_EXPIRE_MINUTES", "1440"))  # 默认24小时
 
+# token -> verified payload; only valid tokens are cached
+_decoded_tokens: TTLCache = TTLCache(maxsize=5000, ttl=30)
+
 
 def create_access_token(
     user_id: str,
@@ -69,8 +74,14 @@ def decode_token(token: str) -> Optional[dict]:
     Returns:
         Decoded payload dict if valid, None otherwise
     """
+    payload = _decoded_tokens.get(token)
+    # A cached token may have expired since it was verified
+    if payload is not None and payload["exp"] > time.time():
+        return payload
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if "exp" in payload:
+            _decoded_tokens[token] = payload
         return payload
     except PyJWTError as e:
         logger.warning(f"JWT decode error: {e}")
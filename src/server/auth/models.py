@@ -6,6 +6,7 @@ Data models for RBAC system.
 These are Pydantic models for request/response, not database models.
 """
 
+from datetime import datetime
 from typing import List, Optional
 from uuid import UUID
 
@@ -46,17 +47,17 @@ class UserResponse(UserBase):
     id: UUID
     is_superuser: bool
     data_permission_level: str
-    last_login_at: Optional[str] = None
-    created_at: str
-    updated_at: str
+    last_login_at: Optional[datetime] = None
+    created_at: datetime
+    updated_at: datetime
     
     class Config:
         from_attributes = True
 
 
 class UserWithRoles(UserResponse):
-    """User with roles information."""
-    roles: List["RoleResponse"] = []
+    """User with roles information; ``roles`` is None when roles were not loaded."""
+    roles: Optional[List["RoleResponse"]] = None
 
 
 class RoleBase(BaseModel):
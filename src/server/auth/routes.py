@@ -5,8 +5,9 @@
 Authentication routes.
 """
 
+import asyncio
 import logging
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
 from uuid import UUID
 
@@ -15,7 +16,7 @@ from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 
 from .dependencies import CurrentUser, get_current_user
 from .db import TokenBlacklist, UserDB
-from .jwt import create_access_token, decode_token, get_token_jti
+from .jwt import create_access_token, decode_token
 from .models import LoginRequest, LoginResponse, TokenResponse, UserInfoResponse
 from .password import verify_password
 from .crypto import decrypt_password, get_public_key
@@ -58,7 +59,7 @@ async def login(request: LoginRequest):
     Returns JWT token and user information.
     """
     # Get user by username
-    user_data = UserDB.get_by_username(request.username)
+    user_data = await UserDB.get_by_username(request.username)
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -77,7 +78,7 @@ async def login(request: LoginRequest):
     # Check if password looks like base64-encoded encrypted data (starts with common base64 chars and is longer)
     # Simple heuristic: if it's base64 and longer than typical plaintext passwords, try decrypting
     if len(password) > 100 and all(c in "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=" for c in password):
-        decrypted = decrypt_password(password)
+        decrypted = await asyncio.to_thread(decrypt_password, password)
         if decrypted is not None:
             password = decrypted
             logger.debug("Password decrypted successfully")
@@ -89,9 +90,9 @@ async def login(request: LoginRequest):
                 detail="Invalid username or password",
             )
     
-    # Verify password
+    # Verify password (bcrypt runs in a worker thread so the event loop stays free)
     password_hash = user_data.get("password_hash")
-    if not password_hash or not verify_password(password, password_hash):
+    if not password_hash or not await asyncio.to_thread(verify_password, password, password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid username or password",
@@ -101,7 +102,7 @@ async def login(request: LoginRequest):
     raw_id = user_data["id"]
     # psycopg with dict_row may already return UUID objects, so handle both cases
     user_id = raw_id if isinstance(raw_id, UUID) else UUID(str(raw_id))
-    roles = UserDB.get_user_roles(user_id)
+    roles = await UserDB.get_user_roles(user_id)
     # Normalize datetime fields to ISO strings for Pydantic models
     def _normalize_role(role: dict) -> dict:
       normalized = {}
@@ -112,7 +113,7 @@ async def login(request: LoginRequest):
               normalized[k] = v
       return normalized
     roles = [_normalize_role(r) for r in roles]
-    permissions = UserDB.get_user_permissions(user_id)
+    permissions = await UserDB.get_user_permissions(user_id)
     
     # Create access token
     token = create_access_token(
@@ -122,7 +123,7 @@ async def login(request: LoginRequest):
     )
     
     # Update last login time
-    UserDB.update_last_login(user_id)
+    await UserDB.update_last_login(user_id)
     
     # Build user response
     user_response = {
@@ -137,9 +138,9 @@ async def login(request: LoginRequest):
         "department_id": user_data.get("department_id"),
         "data_permission_level": user_data.get("data_permission_level", "self"),
         "is_active": user_data.get("is_active", True),
-        "last_login_at": datetime.utcnow().isoformat() if user_data.get("last_login_at") else None,
-        "created_at": user_data.get("created_at").isoformat() if user_data.get("created_at") else None,
-        "updated_at": user_data.get("updated_at").isoformat() if user_data.get("updated_at") else None,
+        "last_login_at": datetime.now(timezone.utc) if user_data.get("last_login_at") else None,
+        "created_at": user_data.get("created_at"),
+        "updated_at": user_data.get("updated_at"),
     }
     
     return LoginResponse(
@@ -167,14 +168,14 @@ async def logout(
         )
     
     # Get token JTI and expiration
-    token_jti = get_token_jti(token)
+    token_jti = payload.get("jti")
     user_id_str = payload.get("sub")
     expires_at = datetime.fromtimestamp(payload.get("exp", 0))
     
     if token_jti and user_id_str:
         try:
             user_id = UUID(user_id_str)
-            TokenBlacklist.add_token(token_jti, user_id, expires_at)
+            await TokenBlacklist.add_token(token_jti, user_id, expires_at)
         except Exception as e:
             logger.error(f"Error adding token to blacklist: {e}")
     
@@ -188,23 +189,19 @@ async def get_current_user_info(
     """
     Get current user information including roles, permissions, and menus.
     """
-    # Get user data
-    user_data = UserDB.get_by_id(current_user.id)
+    # User data, roles, permissions and menus are independent lookups; run them concurrently
+    user_data, roles_data, permissions, menus_data = await asyncio.gather(
+        UserDB.get_by_id(current_user.id),
+        UserDB.get_user_roles(current_user.id),
+        UserDB.get_user_permissions(current_user.id),
+        UserDB.get_user_menus(current_user.id, is_superuser=current_user.is_superuser),
+    )
     if not user_data:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
     
-    # Get user roles
-    roles_data = UserDB.get_user_roles(current_user.id)
-    
-    # Get user permissions
-    permissions = UserDB.get_user_permissions(current_user.id)
-    
-    # Get user menus (tree structure)
-    menus_data = UserDB.get_user_menus(current_user.id)
-    
     # Build menu tree
     def build_menu_tree(menus: list, parent_id: Optional[UUID] = None) -> list:
         """Build menu tree structure."""
@@ -250,7 +247,7 @@ async def get_current_user_info(
         from .admin.organizations import OrganizationDB
         raw_org_id = user_data["organization_id"]
         org_uuid = raw_org_id if isinstance(raw_org_id, UUID) else UUID(str(raw_org_id))
-        org_data = OrganizationDB.get_by_id(org_uuid)
+        org_data = await OrganizationDB.get_by_id(org_uuid)
         if org_data:
             organization = {
                 "id": (
@@ -277,7 +274,7 @@ async def get_current_user_info(
         from .admin.departments import DepartmentDB
         raw_dept_id = user_data["department_id"]
         dept_uuid = raw_dept_id if isinstance(raw_dept_id, UUID) else UUID(str(raw_dept_id))
-        dept_data = DepartmentDB.get_by_id(dept_uuid)
+        dept_data = await DepartmentDB.get_by_id(dept_uuid)
         if dept_data:
             department = {
                 "id": (